@@ -20,5 +20,8 @@ def stop(context):
         # This will run the start function in each of your commands as defined in commands/__init__.py
         commands.stop()
 
+        # Write any log messages still waiting for the next batch
+        futil.flush_log()
+
     except:
         futil.handle_error('stop')
\ No newline at end of file
@@ -1,26 +1,112 @@
 # Here you define the commands that will be added to your add-in.
+#
+# Commands are loaded lazily: at startup only the lightweight command packages
+# are imported, their metadata (see for example surfaceToCsv/__init__.py) is
+# used to create the buttons, and the command implementation in entry.py, with
+# all of its dependencies, is imported the first time the button is clicked.
 
-# TODO Import the modules corresponding to the commands you created.
+import importlib
+import time
+
+import adsk.core
+from ..lib import fusion360utils as futil
+from .. import config
+
+# TODO Import the packages corresponding to the commands you created.
 # If you want to add an additional command, duplicate one of the existing directories and import it here.
-# You need to use aliases (import "entry" as "my_module") assuming you have the default module named "entry".
-from .surfaceToCsv import entry as surfaceToCsv
-from .csvToPoints import entry as csvToPoints
+# Each package defines the command metadata in __init__.py and a command_created function in entry.py.
+# Startup is timed from here, so the imports of the command packages count towards config.STARTUP_BUDGET_MS.
+_import_start_time = time.perf_counter()
+from . import surfaceToCsv  # noqa: E402
+from . import csvToPoints  # noqa: E402
+from . import paletteShow  # noqa: E402
+from . import paletteSend  # noqa: E402
+from . import dumpLog  # noqa: E402
+_import_ms = (time.perf_counter() - _import_start_time) * 1000
 
-# TODO add your imported modules to this list.
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+# TODO add your imported packages to this list.
 # Fusion will automatically call the start() and stop() functions.
 commands = [surfaceToCsv,
-            csvToPoints]
+            csvToPoints,
+            paletteShow,
+            paletteSend,
+            dumpLog]
+
+# Entry modules imported so far, by command package name.
+_entries = {}
 
 
-# Assumes you defined a "start" function in each of your modules.
-# The start function will be run when the add-in is started.
+# Creates the buttons of every command without importing their implementation.
+# The time taken, including the import of the command packages, is logged and a
+# warning is written when it exceeds config.STARTUP_BUDGET_MS.
 def start():
+    start_time = time.perf_counter()
     for command in commands:
-        command.start()
+        _add_button(command)
+    buttons_ms = (time.perf_counter() - start_time) * 1000
+    elapsed_ms = _import_ms + buttons_ms
 
+    futil.logf('Started %s commands in %.1f ms (imports %.1f ms, buttons %.1f ms)', len(commands), elapsed_ms,
+               _import_ms, buttons_ms)
+    if elapsed_ms > config.STARTUP_BUDGET_MS:
+        futil.logf('Command startup took %.1f ms, over the %s ms budget', elapsed_ms, config.STARTUP_BUDGET_MS,
+                   level=adsk.core.LogLevels.WarningLogLevel, force_console=True)
 
-# Assumes you defined a "stop" function in each of your modules.
-# The stop function will be run when the add-in is stopped.
+
+# Removes the buttons and lets the commands that were used run their own stop() function.
 def stop():
     for command in commands:
-        command.stop()
+        entry = _entries.get(command.__name__)
+        if entry is not None and hasattr(entry, 'stop'):
+            entry.stop()
+        _remove_button(command)
+    _entries.clear()
+
+
+# Imports the entry module of a command the first time it is needed.
+def load_entry(command):
+    entry = _entries.get(command.__name__)
+    if entry is None:
+        start_time = time.perf_counter()
+        entry = importlib.import_module('.entry', command.__name__)
+        _entries[command.__name__] = entry
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        futil.logf('%s loaded in %.1f ms', command.CMD_NAME, elapsed_ms)
+    return entry
+
+
+def _add_button(command):
+    # Create a command Definition.
+    cmd_def = ui.commandDefinitions.addButtonDefinition(command.CMD_ID, command.CMD_NAME,
+                                                        command.CMD_Description, command.ICON_FOLDER)
+
+    # The command created event loads the command implementation and forwards the event to it.
+    futil.add_handler(cmd_def.commandCreated, lambda args: load_entry(command).command_created(args),
+                      name=f'{command.CMD_NAME} command created')
+
+    # ******** Add a button into the UI so the user can run the command. ********
+    workspace = ui.workspaces.itemById(command.WORKSPACE_ID)
+    panel = workspace.toolbarPanels.itemById(command.PANEL_ID)
+    control = panel.controls.addCommand(cmd_def, command.COMMAND_BESIDE_ID, False)
+
+    # Specify if the command is promoted to the main toolbar.
+    control.isPromoted = command.IS_PROMOTED
+
+
+def _remove_button(command):
+    # Get the various UI elements for this command
+    workspace = ui.workspaces.itemById(command.WORKSPACE_ID)
+    panel = workspace.toolbarPanels.itemById(command.PANEL_ID)
+    command_control = panel.controls.itemById(command.CMD_ID)
+    command_definition = ui.commandDefinitions.itemById(command.CMD_ID)
+
+    # Delete the button command control
+    if command_control:
+        command_control.deleteMe()
+
+    # Delete the command definition
+    if command_definition:
+        command_definition.deleteMe()
@@ -1,103 +1,116 @@
 import adsk.core
 import adsk.fusion
 import os
-import tkinter
-from tkinter import filedialog
-import csv
 import traceback
+from array import array
 from ...lib import fusion360utils as futil
+from ...lib import pointutils
 from ... import config
+from . import CMD_ID, CMD_NAME
 
 app = adsk.core.Application.get()
 ui = app.userInterface
-tkinter.Tk().withdraw()
 
+# Number of consecutive points joined by lines in each sketch.
+POINTS_PER_SKETCH = 100
 
-# TODO *** Specify the command identity information. ***
-CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_csvToPoints'
-CMD_NAME = 'CSV to Points'
-CMD_Description = 'Imports points from a CSV file.'
+# Number of consecutive points a single fitted spline is fitted to, one sketch each.
+POINTS_PER_SPLINE = 1000
 
-# Specify that the command will be promoted to the panel.
-IS_PROMOTED = True
+# File dialog filter for the supported point files.
+FILE_FILTER = 'Point files (*.csv *.gz *.xz *.bz2 *.stplod);;All files (*.*)'
 
-# TODO *** Define the location where the command button will be created. ***
-# This is done by specifying the workspace, the tab, and the panel, and the 
-# command it will be inserted beside. Not providing the command to position it
-# will insert it at the end.
-WORKSPACE_ID = 'FusionSolidEnvironment'
-PANEL_ID = 'SolidScriptsAddinsPanel'
-COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
+# Number of nearest neighbours used by the statistical outlier removal.
+OUTLIER_NEIGHBORS = 8
 
-# Resource location for command icons, here we assume a sub folder in this directory named "resources".
-ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
-
-# Local list of event handlers used to maintain a reference, so
-# they are not released and garbage collected.
-local_handlers = []
-
-
-# Executed when add-in is run.
-def start():
-    # Create a command Definition.
-    cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
-
-    # Define an event handler for the command created event. It will be called when the button is clicked.
-    futil.add_handler(cmd_def.commandCreated, command_created)
-
-    # ******** Add a button into the UI so the user can run the command. ********
-    # Get the target workspace the button will be created in.
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-
-    # Get the panel the button will be created in.
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-
-    # Create the button command control in the UI after the specified existing command.
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
-
-    # Specify if the command is promoted to the main toolbar. 
-    control.isPromoted = IS_PROMOTED
-
-
-# Executed when add-in is stopped.
-def stop():
-    # Get the various UI elements for this command
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
-
-    # Delete the button command control
-    if command_control:
-        command_control.deleteMe()
-
-    # Delete the command definition
-    if command_definition:
-        command_definition.deleteMe()
+# Number of points committed by each checkpoint of a resumable import, a multiple of
+# POINTS_PER_SKETCH and POINTS_PER_SPLINE so the chunks only create complete sketches.
+JOB_CHUNK_POINTS = 10000
 
 
 # Function that is called when a user clicks the corresponding button in the UI.
 # This defines the contents of the command dialog and connects to the command related events.
 def command_created(args: adsk.core.CommandCreatedEventArgs):
+    # Release any handlers left by a previous instance of this command
+    futil.clear_handlers(CMD_ID)
+
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Created Event')
+    futil.logf('%s Command Created Event', CMD_NAME)
 
     # https://help.autodesk.com/view/fusion360/ENU/?contextId=CommandInputs
     inputs = args.command.commandInputs
 
+    # Create a Dropdown Command Input for the point files source
+    source_input = inputs.addDropDownCommandInput('source_input', 'Import from',
+                                                  adsk.core.DropDownStyles.TextListDropDownStyle)
+    source_input.listItems.add('Single file', True, '')
+    source_input.listItems.add('Multiple files', False, '')
+    source_input.listItems.add('Folder', False, '')
+
+    # Create a Dropdown Command Input to merge the files or keep one result per file
+    merge_input = inputs.addDropDownCommandInput('merge_input', 'Multiple files',
+                                                 adsk.core.DropDownStyles.TextListDropDownStyle)
+    merge_input.listItems.add('Merge into one point sequence', True, '')
+    merge_input.listItems.add('One result per file', False, '')
+    merge_input.isVisible = False
+
+    # Inputs used when the selected file is a LOD container, ignored for CSV files
+    lod_level_input = inputs.addIntegerSpinnerCommandInput('lod_level_input', 'LOD level', -1, 255, 1, -1)
+    lod_level_input.tooltip = 'Highest level of detail to load from a LOD container, -1 loads every level.'
+    region_input = inputs.addSelectionInput('region_input', 'LOD region',
+                                            'Optionally select a body, only points inside its bounding box are loaded.')
+    region_input.setSelectionLimits(0, 1)
+    region_input.addSelectionFilter('Bodies')
+    region_input.addSelectionFilter('MeshBodies')
+
+    # Create a Dropdown Command Input for the created geometry
+    geometry_input = inputs.addDropDownCommandInput('geometry_input', 'Geometry',
+                                                    adsk.core.DropDownStyles.TextListDropDownStyle)
+    geometry_input.listItems.add('Lines', True, '')
+    geometry_input.listItems.add('Fitted splines', False, '')
+    fit_tolerance_input = inputs.addValueInput('fit_tolerance_input', 'Fit tolerance',
+                                               app.activeProduct.unitsManager.defaultLengthUnits,
+                                               adsk.core.ValueInput.createByReal(0.01))
+    fit_tolerance_input.tooltip = 'Maximum distance of the points to the polyline the splines are fitted through.'
+    fit_tolerance_input.isVisible = False
+
+    # Create a Boolean Command Input to run the import as resumable jobs
+    resumable_input = inputs.addBoolValueInput('resumable_input', 'Resumable import', True, '', False)
+    resumable_input.tooltip = ('Reads the files one at a time in chunks and checkpoints each committed chunk, so '
+                               'a failed or cancelled import resumes where it stopped. Malformed rows are '
+                               'quarantined. Files are not parsed in parallel and merged files do not share '
+                               'sketches.')
+
+    # Inputs for the point filters, applied to each file before the sketches are created
+    inputs.addBoolValueInput('duplicates_input', 'Remove duplicates', True, '', False)
+    default_length_units = app.activeProduct.unitsManager.defaultLengthUnits
+    tolerance_input = inputs.addValueInput('tolerance_input', 'Duplicate tolerance', default_length_units,
+                                           adsk.core.ValueInput.createByReal(0.001))
+    tolerance_input.tooltip = 'Points closer than this distance are duplicates.'
+    outliers_input = inputs.addBoolValueInput('outliers_input', 'Remove outliers', True, '', False)
+    outliers_input.tooltip = ('Removes points far from their nearest neighbours. Slow on large files: '
+                              'about 10,000 points per second, several minutes per million points.')
+    std_ratio_input = inputs.addFloatSpinnerCommandInput('std_ratio_input', 'Outlier std ratio', '',
+                                                         0.1, 10, 0.1, 2)
+    std_ratio_input.tooltip = ('Points whose mean distance to their nearest neighbours exceeds the average '
+                               'by more than this number of standard deviations are removed.')
+    merge_scans_input = inputs.addBoolValueInput('merge_scans_input', 'Merge overlapping scans', True, '', False)
+    merge_scans_input.tooltip = 'Drops the points of a file that are within the tolerance of a previous file.'
+    merge_scans_input.isVisible = False
+
     # TODO Connect to the events that are needed by this command.
-    futil.add_handler(args.command.execute, command_execute, local_handlers=local_handlers)
-    futil.add_handler(args.command.inputChanged, command_input_changed, local_handlers=local_handlers)
-    futil.add_handler(args.command.executePreview, command_preview, local_handlers=local_handlers)
-    futil.add_handler(args.command.validateInputs, command_validate_input, local_handlers=local_handlers)
-    futil.add_handler(args.command.destroy, command_destroy, local_handlers=local_handlers)
+    futil.add_handler(args.command.execute, command_execute, scope=CMD_ID)
+    futil.add_handler(args.command.inputChanged, command_input_changed, scope=CMD_ID)
+    futil.add_handler(args.command.executePreview, command_preview, scope=CMD_ID)
+    futil.add_handler(args.command.validateInputs, command_validate_input, scope=CMD_ID)
+    futil.add_handler(args.command.destroy, command_destroy, scope=CMD_ID)
 
 
 # This event handler is called when the user clicks the OK button in the command dialog or 
 # is immediately called after the created event not command inputs were created for the dialog.
 def command_execute(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Execute Event')
+    futil.logf('%s Command Execute Event', CMD_NAME)
 
     # TODO ******************************** Your code here ********************************
     try:
@@ -113,49 +126,136 @@ def command_execute(args: adsk.core.CommandEventArgs):
         default_length_units = units_manager.defaultLengthUnits
         debug_info = ''
 
-        # Get CSV file
-        csv_filename = filedialog.askopenfilename()
-        debug_info += f'CSV file name: {csv_filename}.'
+        # Get a reference to your command's inputs.
+        inputs = args.command.commandInputs
+        source_input: adsk.core.DropDownCommandInput = inputs.itemById('source_input')
+        merge_input: adsk.core.DropDownCommandInput = inputs.itemById('merge_input')
+        lod_level_input: adsk.core.IntegerSpinnerCommandInput = inputs.itemById('lod_level_input')
+        region_input: adsk.core.SelectionCommandInput = inputs.itemById('region_input')
+        duplicates_input: adsk.core.BoolValueCommandInput = inputs.itemById('duplicates_input')
+        tolerance_input: adsk.core.ValueCommandInput = inputs.itemById('tolerance_input')
+        outliers_input: adsk.core.BoolValueCommandInput = inputs.itemById('outliers_input')
+        std_ratio_input: adsk.core.FloatSpinnerCommandInput = inputs.itemById('std_ratio_input')
+        merge_scans_input: adsk.core.BoolValueCommandInput = inputs.itemById('merge_scans_input')
+        geometry_input: adsk.core.DropDownCommandInput = inputs.itemById('geometry_input')
+        fit_tolerance_input: adsk.core.ValueCommandInput = inputs.itemById('fit_tolerance_input')
+        resumable_input: adsk.core.BoolValueCommandInput = inputs.itemById('resumable_input')
+        merge = merge_input.selectedItem.index == 0
+        fit_splines = geometry_input.selectedItem.index == 1
+
+        # Get point files, in a deterministic order
+        csv_filenames = _select_point_files(source_input.selectedItem.index)
+        if not csv_filenames:
+            return
+        if len(csv_filenames) == 1:
+            debug_info += f'CSV file name: {csv_filenames[0]}.'
+        else:
+            debug_info += f'Number of files: {len(csv_filenames)}.'
+
+        # Only the blocks of the requested level and region are read from LOD containers
+        lod_level = lod_level_input.value if lod_level_input.value >= 0 else None
+        region = None
+        if region_input.selectionCount > 0:
+            box = region_input.selection(0).entity.boundingBox
+            region = [units_manager.convert(c, 'cm', default_length_units)
+                      for c in (box.minPoint.x, box.minPoint.y, box.minPoint.z,
+                                box.maxPoint.x, box.maxPoint.y, box.maxPoint.z)]
+
+        # The filters work on the points in the default length units
+        tolerance = units_manager.convert(tolerance_input.value, 'cm', default_length_units)
+        remove_duplicates = duplicates_input.value
+        std_ratio = std_ratio_input.value if outliers_input.value else None
+        scan_merger = None
+        if merge and len(csv_filenames) > 1 and merge_scans_input.value:
+            scan_merger = pointutils.ScanMerger(tolerance)
+
+        # The points are in the default length units, the sketches in centimeters
+        scale = units_manager.convert(1, default_length_units, 'cm')
+        plane = root_comp.xYConstructionPlane
+
+        # Fitted splines replace the lines of each block with one spline through few points
+        fit_tolerance = units_manager.convert(fit_tolerance_input.value, 'cm', default_length_units)
+        fit_results = {'points': 0, 'deviation': 0.0}
+        block_points = POINTS_PER_SPLINE if fit_splines else POINTS_PER_SKETCH
+
+        def create_sketches(points, name=None):
+            if fit_splines:
+                return _create_spline_sketches(sketches, plane, points, scale, fit_tolerance, fit_results, name)
+            return _create_sketches(sketches, plane, points, scale, name)
 
-        # Get CSV data
-        csv_data = []
         row_count = 0
-        with open(csv_filename) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            for row in csv_reader:
-                point_data = [row[0], row[1], row[2]]
-                csv_data.append(point_data)
-                row_count += 1
-        debug_info += f'<br>Number of points: {row_count}.'
-
-        # Create sketches
-        p_x_s = 100  # points per sketch
-        n_sketches = row_count // 100
-        rem_points = row_count % 100
-        if rem_points >= 2:
-            rem_sketch = 1
+        removed_count = 0
+        sketch_count = 0
+        if resumable_input.value:
+            # Import each file as a job committing one chunk at a time
+            job_options = {
+                'merge': merge, 'lod_level': lod_level, 'region': region, 'geometry': geometry_input.selectedItem.index,
+                'fit_tolerance': fit_tolerance, 'remove_duplicates': remove_duplicates, 'tolerance': tolerance,
+                'std_ratio': std_ratio, 'merge_scans': scan_merger is not None,
+            }
+
+            # Ask about interrupted imports before the progress dialog is shown
+            checkpoints = []
+            for csv_filename in csv_filenames:
+                checkpoint = _load_checkpoint(design, csv_filename, job_options)
+                if checkpoint is None:
+                    return
+                checkpoints.append(checkpoint)
+
+            progress_dialog = ui.createProgressDialog()
+            progress_dialog.isCancelButtonShown = True
+            progress_dialog.show(CMD_NAME, 'Starting the import', 0, 100)
+            try:
+                for csv_filename, checkpoint in zip(csv_filenames, checkpoints):
+                    name = None if merge else os.path.splitext(os.path.basename(csv_filename))[0]
+                    job = _run_import_job(sketches, checkpoint, name, create_sketches,
+                                          lambda points: _filter_points(points, remove_duplicates, tolerance,
+                                                                        std_ratio, scan_merger),
+                                          progress_dialog)
+                    row_count += job['points']
+                    removed_count += job['removed']
+                    sketch_count += job['sketches']
+                    if job['quarantined']:
+                        debug_info += (f'<br>Malformed rows of "{csv_filename}" quarantined: {job["quarantined"]}, '
+                                       f'see "{job["quarantine_path"]}".')
+                    if job['cancelled']:
+                        debug_info += '<br>Import cancelled, run the command again to resume it.'
+                        break
+            except:
+                ui.messageBox('Import stopped, the sketches of the last checkpoint are kept and the command '
+                              'resumes from there when run again.\n\n{}'.format(traceback.format_exc()))
+                return
+            finally:
+                progress_dialog.hide()
         else:
-            rem_sketch = 0
-        p_idx = 0  # points index
-        debug_info += f'<br>Number of Sketches: {n_sketches + rem_sketch}'
-        debug_info += f'<br>Remainder points: {rem_points}'
-        for n_sketch in range(n_sketches + rem_sketch):
-            csv_sketch = sketches.add(root_comp.xYConstructionPlane)
-            if n_sketch is n_sketches:
-                n_points = rem_points - 1
-            else:
-                n_points = p_x_s - 1
-            for i in range(n_points):
-                min_point_c = []
-                max_point_c = []
-                for a in range(3):
-                    min_point_c.append(units_manager.convert(float(csv_data[i+p_idx][a]), default_length_units, 'cm'))
-                for b in range(3):
-                    max_point_c.append(units_manager.convert(float(csv_data[i+p_idx+1][b]), default_length_units, 'cm'))
-                min_point = adsk.core.Point3D.create(min_point_c[0], min_point_c[1], min_point_c[2])
-                max_point = adsk.core.Point3D.create(max_point_c[0], max_point_c[1], max_point_c[2])
-                csv_sketch.sketchCurves.sketchLines.addByTwoPoints(min_point, max_point)
-            p_idx += p_x_s
+            # Parse the files in worker processes while the sketches are created on this thread
+            merged_points = array('d')
+            for csv_filename, csv_points in pointutils.iter_point_files(csv_filenames, lod_level=lod_level,
+                                                                         region=region):
+                row_count += len(csv_points) // 3
+                filtered_points = _filter_points(csv_points, remove_duplicates, tolerance, std_ratio, scan_merger)
+                removed_count += (len(csv_points) - len(filtered_points)) // 3
+                csv_points = filtered_points
+                if not merge:
+                    name = os.path.splitext(os.path.basename(csv_filename))[0]
+                    sketch_count += create_sketches(csv_points, name)
+                    continue
+
+                # Create the complete sketches and carry the remaining points over to the next file
+                merged_points.extend(csv_points)
+                complete = len(merged_points) // (3 * block_points) * 3 * block_points
+                sketch_count += create_sketches(merged_points[:complete])
+                del merged_points[:complete]
+            sketch_count += create_sketches(merged_points)
+
+        debug_info += f'<br>Number of points: {row_count}.'
+        if remove_duplicates or std_ratio is not None or scan_merger is not None:
+            debug_info += f'<br>Points removed by the filters: {removed_count}.'
+        debug_info += f'<br>Number of Sketches: {sketch_count}'
+        if fit_splines:
+            debug_info += f'<br>Spline fit points: {fit_results["points"]}.'
+            debug_info += (f'<br>Maximum fitting deviation: {fit_results["deviation"]:.6g} '
+                           f'{default_length_units}.')
 
         # Show Debug Info
         ui.messageBox(debug_info)
@@ -165,10 +265,200 @@ def command_execute(args: adsk.core.CommandEventArgs):
             ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
 
+# Asks for the point files to import, sorted by path, or returns an empty list if cancelled.
+# source_index is the index of the 'Import from' dropdown item.
+def _select_point_files(source_index: int) -> list:
+    if source_index == 2:
+        folder_dialog = ui.createFolderDialog()
+        folder_dialog.title = 'Select a folder of point files'
+        if folder_dialog.showDialog() != adsk.core.DialogResults.DialogOK:
+            return []
+        return pointutils.list_point_files(folder_dialog.folder)
+
+    file_dialog = ui.createFileDialog()
+    file_dialog.title = 'Select point files' if source_index == 1 else 'Select a point file'
+    file_dialog.filter = FILE_FILTER
+    file_dialog.isMultiSelectEnabled = source_index == 1
+    if file_dialog.showOpen() != adsk.core.DialogResults.DialogOK:
+        return []
+    return sorted(file_dialog.filenames)
+
+
+# Returns the checkpoint of the import job of a point file. When an interrupted import of the
+# file is found, the user chooses to resume it or to delete its sketches and start over.
+# Returns None if the user cancelled. Checkpoints are kept in the per-user jobs folder.
+def _load_checkpoint(design: adsk.fusion.Design, path: str, options: dict) -> pointutils.ImportCheckpoint:
+    checkpoint = pointutils.ImportCheckpoint(path, options, config.IMPORT_JOBS_FOLDER)
+    if checkpoint.load():
+        committed = [design.findEntityByToken(token) for token in checkpoint.sketches]
+        if not all(committed):
+            futil.logf('%s: Sketches of the interrupted import of %s were deleted, starting over', CMD_NAME, path)
+            checkpoint = pointutils.ImportCheckpoint(path, options, config.IMPORT_JOBS_FOLDER)
+        else:
+            answer = ui.messageBox(f'The import of "{path}" stopped at line {checkpoint.line} after creating '
+                                   f'{len(committed)} sketches.\n\nYes: resume from there.\n'
+                                   f'No: delete those sketches and start over.',
+                                   CMD_NAME, adsk.core.MessageBoxButtonTypes.YesNoCancelButtonType,
+                                   adsk.core.MessageBoxIconTypes.QuestionIconType)
+            if answer == adsk.core.DialogResults.DialogCancel:
+                return None
+            if answer == adsk.core.DialogResults.DialogNo:
+                for entities in reversed(committed):
+                    entities[0].deleteMe()
+                checkpoint = pointutils.ImportCheckpoint(path, options, config.IMPORT_JOBS_FOLDER)
+    return checkpoint
+
+
+# Imports a point file as a job that commits JOB_CHUNK_POINTS points at a time and saves a
+# checkpoint after each chunk. The sketches of a chunk that fails are deleted, so a new run
+# resumes from the last checkpoint. Returns the job results. In resumable imports the filters
+# work chunk by chunk, and points are not carried over between files, so each file ends
+# with its own last sketch.
+def _run_import_job(sketches: adsk.fusion.Sketches, checkpoint: pointutils.ImportCheckpoint, name: str,
+                    create_sketches, filter_points, progress_dialog: adsk.core.ProgressDialog) -> dict:
+    path = checkpoint.path
+    options = checkpoint.options
+
+    # Quarantine files are written next to the point file when possible
+    quarantine_folder = None if os.access(os.path.dirname(path), os.W_OK) else config.IMPORT_JOBS_FOLDER
+    job = {'points': 0, 'removed': 0, 'sketches': 0, 'quarantined': 0, 'quarantine_path': None, 'cancelled': False}
+    size = os.path.getsize(path)
+    show_offset = not pointutils.is_lod_file(path) and pointutils.detect_compression(path) is None
+    quarantine = pointutils.QuarantineFile(path, checkpoint.quarantine_size, quarantine_folder)
+    try:
+        for points, offset, line in pointutils.iter_point_chunks(path, JOB_CHUNK_POINTS, checkpoint.offset,
+                                                                 checkpoint.line, quarantine,
+                                                                 options['lod_level'], options['region']):
+            first = sketches.count
+            try:
+                filtered_points = filter_points(points)
+                create_sketches(filtered_points)
+            except:
+                # Roll back the partial chunk
+                for i in reversed(range(first, sketches.count)):
+                    sketches.item(i).deleteMe()
+                raise
+            for i in range(first, sketches.count):
+                sketch = sketches.item(i)
+                if name:
+                    sketch.name = f'{name} {len(checkpoint.sketches) + 1}'
+                checkpoint.sketches.append(sketch.entityToken)
+
+            # Commit the chunk
+            checkpoint.offset = offset
+            checkpoint.line = line
+            checkpoint.points += len(points) // 3
+            checkpoint.quarantine_size = quarantine.size
+            checkpoint.save()
+            job['points'] += len(points) // 3
+            job['removed'] += (len(points) - len(filtered_points)) // 3
+            job['sketches'] += sketches.count - first
+
+            progress_dialog.message = f'{os.path.basename(path)}: {checkpoint.points} points imported'
+            if show_offset and size:
+                progress_dialog.progressValue = offset * 100 // size
+            adsk.doEvents()
+            if progress_dialog.wasCancelled:
+                job['cancelled'] = True
+                return job
+    finally:
+        job['quarantined'] = quarantine.count
+        job['quarantine_path'] = quarantine.quarantine_path
+        quarantine.close()
+
+    checkpoint.remove()
+    return job
+
+
+# Removes duplicates, then outliers, then the points overlapping previous files from a
+# flat x, y, z sequence. std_ratio and scan_merger are None when those filters are off.
+def _filter_points(points, remove_duplicates: bool, tolerance: float, std_ratio, scan_merger):
+    if remove_duplicates:
+        points = pointutils.remove_duplicates(points, tolerance)
+    if std_ratio is not None:
+        points = pointutils.remove_outliers(points, OUTLIER_NEIGHBORS, std_ratio)
+    if scan_merger is not None:
+        points = scan_merger.add(points)
+    return points
+
+
+# Creates one sketch of consecutive lines per block of POINTS_PER_SKETCH points and
+# returns the number of sketches. A trailing block with less than two points is skipped,
+# as are the zero length lines between repeated points.
+# points is a flat x, y, z sequence in the default length units, scale converts it to cm.
+def _create_sketches(sketches: adsk.fusion.Sketches, plane, points, scale: float, name: str = None) -> int:
+    n_points = len(points) // 3
+    sketch_count = 0
+    for start in range(0, n_points, POINTS_PER_SKETCH):
+        end = min(start + POINTS_PER_SKETCH, n_points)
+        if end - start < 2:
+            break
+        csv_sketch = sketches.add(plane)
+        if name:
+            csv_sketch.name = f'{name} {sketch_count + 1}'
+
+        # Defer the sketch solve until all its lines are added
+        csv_sketch.isComputeDeferred = True
+        sketch_lines = csv_sketch.sketchCurves.sketchLines
+        i = 3 * start
+        min_point = adsk.core.Point3D.create(points[i] * scale, points[i + 1] * scale, points[i + 2] * scale)
+        line_count = 0
+        for i in range(3 * (start + 1), 3 * end, 3):
+            if points[i:i + 3] == points[i - 3:i]:
+                continue
+            max_point = adsk.core.Point3D.create(points[i] * scale, points[i + 1] * scale, points[i + 2] * scale)
+            sketch_lines.addByTwoPoints(min_point, max_point)
+            min_point = max_point
+            line_count += 1
+        csv_sketch.isComputeDeferred = False
+        if line_count == 0:
+            csv_sketch.deleteMe()
+            continue
+        sketch_count += 1
+    return sketch_count
+
+
+# Creates one sketch with a fitted spline per block of POINTS_PER_SPLINE points and returns
+# the number of sketches. The spline passes through the points of the block kept by the
+# simplification within tolerance, fit_results accumulates the number of fit points and the
+# maximum distance of the block points to the created splines, in the default length units.
+def _create_spline_sketches(sketches: adsk.fusion.Sketches, plane, points, scale: float, tolerance: float,
+                            fit_results: dict, name: str = None) -> int:
+    n_points = len(points) // 3
+    sketch_count = 0
+    for start in range(0, n_points, POINTS_PER_SPLINE):
+        end = min(start + POINTS_PER_SPLINE, n_points)
+        block = points[3 * start:3 * end]
+        kept = pointutils.simplify_polyline(block, tolerance)
+        if len(kept) < 2:
+            continue
+        spline_sketch = sketches.add(plane)
+        if name:
+            spline_sketch.name = f'{name} {sketch_count + 1}'
+
+        fit_points = adsk.core.ObjectCollection.create()
+        for i in kept:
+            fit_points.add(adsk.core.Point3D.create(block[3 * i] * scale, block[3 * i + 1] * scale,
+                                                    block[3 * i + 2] * scale))
+        spline = spline_sketch.sketchCurves.sketchFittedSplines.add(fit_points)
+        sketch_count += 1
+        fit_results['points'] += len(kept)
+
+        # Measure the deviation against a fine polyline of the created spline
+        evaluator = spline.geometry.evaluator
+        _, start_parameter, end_parameter = evaluator.getParameterExtents()
+        _, stroke_points = evaluator.getStrokes(start_parameter, end_parameter, tolerance * scale / 10)
+        strokes = array('d')
+        for point in stroke_points:
+            strokes.extend((point.x / scale, point.y / scale, point.z / scale))
+        fit_results['deviation'] = max(fit_results['deviation'], pointutils.max_deviation(block, strokes))
+    return sketch_count
+
+
 # This event handler is called when the command needs to compute a new preview in the graphics window.
 def command_preview(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Preview Event')
+    futil.logf('%s Command Preview Event', CMD_NAME)
     inputs = args.command.commandInputs
 
 
@@ -179,22 +469,41 @@ def command_input_changed(args: adsk.core.InputChangedEventArgs):
     inputs = args.inputs
 
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Input Changed Event fired from a change to {changed_input.id}')
+    futil.logf('%s Input Changed Event fired from a change to %s', CMD_NAME, changed_input.id)
+
+    # The fit tolerance only applies to fitted splines
+    if changed_input.id == 'geometry_input':
+        geometry_input: adsk.core.DropDownCommandInput = inputs.itemById('geometry_input')
+        inputs.itemById('fit_tolerance_input').isVisible = geometry_input.selectedItem.index == 1
+
+    # Merging only applies when several files are imported
+    if changed_input.id in ('source_input', 'merge_input'):
+        source_input: adsk.core.DropDownCommandInput = inputs.itemById('source_input')
+        merge_input: adsk.core.DropDownCommandInput = inputs.itemById('merge_input')
+        inputs.itemById('merge_input').isVisible = source_input.selectedItem.index > 0
+        inputs.itemById('merge_scans_input').isVisible = (source_input.selectedItem.index > 0 and
+                                                          merge_input.selectedItem.index == 0)
 
 
 # This event handler is called when the user interacts with any of the inputs in the dialog
 # which allows you to verify all the inputs are valid and enables the OK button.
 def command_validate_input(args: adsk.core.ValidateInputsEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Validate Input Event')
+    futil.logf('%s Validate Input Event', CMD_NAME)
 
     inputs = args.inputs
-        
+
+    # Splines can only be fitted within a positive tolerance
+    geometry_input: adsk.core.DropDownCommandInput = inputs.itemById('geometry_input')
+    fit_tolerance_input: adsk.core.ValueCommandInput = inputs.itemById('fit_tolerance_input')
+    if geometry_input.selectedItem.index == 1 and fit_tolerance_input.value <= 0:
+        args.areInputsValid = False
+
 
 # This event handler is called when the command terminates.
 def command_destroy(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Destroy Event')
+    futil.logf('%s Command Destroy Event', CMD_NAME)
 
-    global local_handlers
-    local_handlers = []
+    # Release the event handlers of this command instance
+    futil.clear_handlers(CMD_ID)
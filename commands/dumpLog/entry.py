@@ -0,0 +1,49 @@
+import adsk.core
+from ...lib import fusion360utils as futil
+from . import CMD_ID
+
+app = adsk.core.Application.get()
+ui = app.userInterface
+
+
+# Function that is called when a user clicks the corresponding button in the UI.
+# This defines the contents of the command dialog and connects to the command related events.
+def command_created(args: adsk.core.CommandCreatedEventArgs):
+    # Release any handlers left by a previous instance of this command
+    futil.clear_handlers(CMD_ID)
+
+    # https://help.autodesk.com/view/fusion360/ENU/?contextId=CommandInputs
+    inputs = args.command.commandInputs
+
+    # Create an Integer Spinner Command Input for the number of events
+    inputs.addIntegerSpinnerCommandInput('count_input', 'Number of events', 1, futil.LOG_BUFFER_SIZE, 10, 100)
+
+    futil.add_handler(args.command.execute, command_execute, scope=CMD_ID)
+    futil.add_handler(args.command.destroy, command_destroy, scope=CMD_ID)
+
+
+# This event handler is called when the user clicks the OK button in the command dialog.
+def command_execute(args: adsk.core.CommandEventArgs):
+    inputs = args.command.commandInputs
+    count_input: adsk.core.IntegerSpinnerCommandInput = inputs.itemById('count_input')
+
+    # Write pending messages first so the dump is not interleaved with them
+    futil.flush_log()
+    dump = futil.dump_log(count_input.value)
+    app.log(f'===== Last {count_input.value} log events =====\n{dump}',
+            adsk.core.LogLevels.InfoLogLevel, adsk.core.LogTypes.ConsoleLogType)
+
+    # Event handler timings help to find the callbacks that stall Fusion
+    app.log(f'===== Event handler timings =====\n{futil.format_handler_stats()}',
+            adsk.core.LogLevels.InfoLogLevel, adsk.core.LogTypes.ConsoleLogType)
+
+    # Show the Text Command window where the dump was written
+    text_palette = ui.palettes.itemById('TextCommands')
+    if text_palette:
+        text_palette.isVisible = True
+
+
+# This event handler is called when the command terminates.
+def command_destroy(args: adsk.core.CommandEventArgs):
+    # Release the event handlers of this command instance
+    futil.clear_handlers(CMD_ID)
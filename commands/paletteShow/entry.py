@@ -2,18 +2,16 @@ import json
 import adsk.core
 import os
 from ...lib import fusion360utils as futil
+from ...lib import pointutils
 from ... import config
+from . import CMD_ID, CMD_NAME
 from datetime import datetime
 
 app = adsk.core.Application.get()
 ui = app.userInterface
 
 # TODO ********************* Change these names *********************
-CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_PalleteShow'
-CMD_NAME = 'Show My Palette'
-CMD_Description = 'A Fusion 360 Add-in Palette'
-PALETTE_NAME = 'My Palette Sample'
-IS_PROMOTED = False
+PALETTE_NAME = 'Point Cloud Viewer'
 
 # Using "global" variables by referencing values from /config.py
 PALETTE_ID = config.sample_palette_id
@@ -28,61 +26,11 @@ PALETTE_URL = PALETTE_URL.replace('\\', '/')
 # Set a default docking behavior for the palette
 PALETTE_DOCKING = adsk.core.PaletteDockingStates.PaletteDockStateRight
 
-# TODO *** Define the location where the command button will be created. ***
-# This is done by specifying the workspace, the tab, and the panel, and the 
-# command it will be inserted beside. Not providing the command to position it
-# will insert it at the end.
-WORKSPACE_ID = 'FusionSolidEnvironment'
-PANEL_ID = 'SolidScriptsAddinsPanel'
-COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
 
-# Resource location for command icons, here we assume a sub folder in this directory named "resources".
-ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
-
-# Local list of event handlers used to maintain a reference so
-# they are not released and garbage collected.
-local_handlers = []
-
-
-# Executed when add-in is run.
-def start():
-    # Create a command Definition.
-    cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
-
-    # Add command created handler. The function passed here will be executed when the command is executed.
-    futil.add_handler(cmd_def.commandCreated, command_created)
-
-    # ******** Add a button into the UI so the user can run the command. ********
-    # Get the target workspace the button will be created in.
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-
-    # Get the panel the button will be created in.
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-
-    # Create the button command control in the UI after the specified existing command.
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
-
-    # Specify if the command is promoted to the main toolbar. 
-    control.isPromoted = IS_PROMOTED
-
-
-# Executed when add-in is stopped.
+# Executed when add-in is stopped, if the command was used.
 def stop():
-    # Get the various UI elements for this command
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
     palette = ui.palettes.itemById(PALETTE_ID)
 
-    # Delete the button command control
-    if command_control:
-        command_control.deleteMe()
-
-    # Delete the command definition
-    if command_definition:
-        command_definition.deleteMe()
-
     # Delete the Palette
     if palette:
         palette.deleteMe()
@@ -93,19 +41,22 @@ def stop():
 # a dialog, don't create any inputs and the execute event will be immediately fired.
 # You also need to connect to any command related events here.
 def command_created(args: adsk.core.CommandCreatedEventArgs):
+    # Release any handlers left by a previous instance of this command
+    futil.clear_handlers(CMD_ID)
+
     # General logging for debug.
-    futil.log(f'{CMD_NAME}: Command created event.')
+    futil.logf('%s: Command created event.', CMD_NAME)
 
     # Create the event handlers you will need for this instance of the command
-    futil.add_handler(args.command.execute, command_execute, local_handlers=local_handlers)
-    futil.add_handler(args.command.destroy, command_destroy, local_handlers=local_handlers)
+    futil.add_handler(args.command.execute, command_execute, scope=CMD_ID)
+    futil.add_handler(args.command.destroy, command_destroy, scope=CMD_ID)
 
 
 # Because no command inputs are being added in the command created event, the execute
 # event is immediately fired.
 def command_execute(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME}: Command execute event.')
+    futil.logf('%s: Command execute event.', CMD_NAME)
 
     palettes = ui.palettes
     palette = palettes.itemById(PALETTE_ID)
@@ -124,7 +75,7 @@ def command_execute(args: adsk.core.CommandEventArgs):
         futil.add_handler(palette.closed, palette_closed)
         futil.add_handler(palette.navigatingURL, palette_navigating)
         futil.add_handler(palette.incomingFromHTML, palette_incoming)
-        futil.log(f'{CMD_NAME}: Created a new palette: ID = {palette.id}, Name = {palette.name}')
+        futil.logf('%s: Created a new palette: ID = %s, Name = %s', CMD_NAME, palette.id, palette.name)
 
     if palette.dockingState == adsk.core.PaletteDockingStates.PaletteDockStateFloating:
         palette.dockingState = PALETTE_DOCKING
@@ -135,19 +86,19 @@ def command_execute(args: adsk.core.CommandEventArgs):
 # Use this to handle a user closing your palette.
 def palette_closed(args: adsk.core.UserInterfaceGeneralEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME}: Palette was closed.')
+    futil.logf('%s: Palette was closed.', CMD_NAME)
 
 
 # Use this to handle a user navigating to a new page in your palette.
 def palette_navigating(args: adsk.core.NavigationEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME}: Palette navigating event.')
+    futil.logf('%s: Palette navigating event.', CMD_NAME)
 
     # Get the URL the user is navigating to:
     url = args.navigationURL
 
     log_msg = f"User is attempting to navigate to {url}\n"
-    futil.log(log_msg, adsk.core.LogLevels.InfoLogLevel)
+    futil.log(log_msg, level=adsk.core.LogLevels.InfoLogLevel)
 
     # Check if url is an external site and open in user's default browser.
     if url.startswith("http"):
@@ -157,37 +108,30 @@ def palette_navigating(args: adsk.core.NavigationEventArgs):
 # Use this to handle events sent from javascript in your palette.
 def palette_incoming(html_args: adsk.core.HTMLEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME}: Palette incoming event.')
+    futil.logf('%s: Palette incoming event.', CMD_NAME)
 
-    message_data: dict = json.loads(html_args.data)
-    message_action = html_args.action
+    # Point streams use the chunked transport, the return value acknowledges each chunk.
+    if html_args.action in pointutils.STREAM_ACTIONS:
+        html_args.returnData = pointutils.handle_stream_message(html_args.action, html_args.data)
+        if html_args.action == 'pointStreamEnd':
+            stream = pointutils.pop_received_stream(json.loads(html_args.data)['stream'])
+            futil.logf('%s: Received %s points from the palette.', CMD_NAME, len(stream.values) // 3)
+        return
 
     log_msg = f"Event received from {html_args.firingEvent.sender.name}\n"
-    log_msg += f"Action: {message_action}\n"
-    log_msg += f"Data: {message_data}"
-    futil.log(log_msg, adsk.core.LogLevels.InfoLogLevel)
-
-    # TODO ******** Your palette reaction code here ********
-
-    # Read message sent from palette javascript and react appropriately.
-    if message_action == 'messageFromPalette':
-        arg1 = message_data.get('arg1', 'arg1 not sent')
-        arg2 = message_data.get('arg2', 'arg2 not sent')
-
-        msg = 'An event has been fired from the html to Fusion with the following data:<br/>'
-        msg += f'<b>Action</b>: {message_action}<br/><b>arg1</b>: {arg1}<br/><b>arg2</b>: {arg2}'               
-        ui.messageBox(msg)
+    log_msg += f"Action: {html_args.action}"
+    futil.log(log_msg, level=adsk.core.LogLevels.InfoLogLevel)
 
     # Return value.
     now = datetime.now()
     currentTime = now.strftime('%H:%M:%S')
-    html_args.returnData = f'OK - {currentTime}'
+    html_args.returnData = f'Unexpected action - {currentTime}'
 
 
 # This event handler is called when the command terminates.
 def command_destroy(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME}: Command destroy event.')
+    futil.logf('%s: Command destroy event.', CMD_NAME)
 
-    global local_handlers
-    local_handlers = []
+    # Release the event handlers of this command instance
+    futil.clear_handlers(CMD_ID)
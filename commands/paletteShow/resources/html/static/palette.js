@@ -1,39 +1,224 @@
-function getDateString() {
-    const today = new Date();
-    const date = `${today.getDate()}/${today.getMonth() + 1}/${today.getFullYear()}`;
-    const time = `${today.getHours()}:${today.getMinutes()}:${today.getSeconds()}`;
-    return `Date: ${date}, Time: ${time}`;
+// Palette glue: receives point streams from Fusion, loads local point files and
+// feeds both to the PointCloudViewer defined in viewer.js.
+
+let viewer = null;
+let loadedPoints = null;
+
+function setStatus(text) {
+    document.getElementById("streamStatus").innerHTML = text;
+}
+
+function showFrameInfo(frameViewer) {
+    if (frameViewer.octree !== null && loadedPoints !== null) {
+        setStatus(`${loadedPoints.length / 3} points, ${frameViewer.drawnPoints} drawn`);
+    }
+}
+
+window.addEventListener("load", () => {
+    try {
+        viewer = new PointCloudViewer(document.getElementById("viewerCanvas"));
+        viewer.onframe = showFrameInfo;
+    } catch (e) {
+        setStatus(`The viewer could not be started: ${e.message}`);
+    }
+});
+
+function setPointSize() {
+    viewer.setPointSize(Number(document.getElementById("pointSize").value));
+}
+
+function resetView() {
+    viewer.resetView();
 }
 
-function sendInfoToFusion() {
-    const args = {
-        arg1: document.getElementById("sampleData").value,
-        arg2: getDateString()
+// ******** Chunked point streams, see lib/pointutils/transport.py for the protocol ********
+const STREAM_CHUNK_VALUES = 3 << 16;
+const STREAM_WINDOW = 4;
+const TYPED_ARRAYS = {float32: Float32Array, float64: Float64Array, int32: Int32Array};
+const incomingStreams = {};
+let nextStreamId = 1;
+
+function base64ToBytes(data) {
+    const binary = atob(data);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes;
+}
+
+function bytesToBase64(bytes) {
+    // Convert in slices, String.fromCharCode.apply fails on very large arguments.
+    const parts = [];
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        parts.push(String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000)));
+    }
+    return btoa(parts.join(""));
+}
+
+function beginPointStream(messageString) {
+    const message = JSON.parse(messageString);
+    // The whole cloud is allocated once as float32 for the viewer, chunks are copied into it as they arrive.
+    const stream = {
+        name: message.name,
+        ArrayType: TYPED_ARRAYS[message.dtype],
+        chunkValues: message.chunk_values,
+        values: new Float32Array(message.count),
+        received: 0,
     };
+    incomingStreams[message.stream] = stream;
+    viewer.load(stream.values);
+    setStatus(`Receiving ${stream.name}: 0 of ${message.count / 3} points`);
+}
 
-    // Send the data to Fusion as a JSON string. The return value is a Promise.
-    adsk.fusionSendData("messageFromPalette", JSON.stringify(args)).then((result) =>
-        document.getElementById("returnValue").innerHTML = `${result}`
+function addPointStreamChunk(messageString) {
+    const message = JSON.parse(messageString);
+    const stream = incomingStreams[message.stream];
+    const chunk = new stream.ArrayType(base64ToBytes(message.data).buffer);
+    stream.values.set(chunk, message.seq * stream.chunkValues);
+    stream.received += chunk.length;
+    viewer.progress(stream.values, stream.received);
+    setStatus(`Receiving ${stream.name}: ${stream.received / 3} of ${stream.values.length / 3} points`);
+
+    // Acknowledge the chunk so Fusion sends the next one.
+    adsk.fusionSendData("pointStreamAck", JSON.stringify({stream: message.stream, seq: message.seq}));
+}
+
+function endPointStream(messageString) {
+    const message = JSON.parse(messageString);
+    const stream = incomingStreams[message.stream];
+    delete incomingStreams[message.stream];
+    setStatus(`Building the octree of ${stream.name}`);
+    viewer.finish(stream.values, stream.values.length / 3);
+    loadedPoints = stream.values;
+}
+
+async function sendPointsToFusion(values, name) {
+    const stream = `html-${nextStreamId++}`;
+    const dtype = Object.keys(TYPED_ARRAYS).find((key) => values instanceof TYPED_ARRAYS[key]);
+    const chunks = Math.ceil(values.length / STREAM_CHUNK_VALUES);
+    await adsk.fusionSendData("pointStreamBegin",
+        JSON.stringify({stream: stream, name: name, dtype: dtype, count: values.length, chunks: chunks}));
+
+    // Keep at most STREAM_WINDOW chunks waiting for the acknowledgement returned by Fusion.
+    const pending = new Set();
+    for (let seq = 0; seq < chunks; seq++) {
+        const chunk = values.subarray(seq * STREAM_CHUNK_VALUES, (seq + 1) * STREAM_CHUNK_VALUES);
+        const bytes = new Uint8Array(chunk.buffer, chunk.byteOffset, chunk.byteLength);
+        const promise = adsk.fusionSendData("pointStreamChunk",
+            JSON.stringify({stream: stream, seq: seq, data: bytesToBase64(bytes)}));
+        pending.add(promise);
+        promise.then(() => pending.delete(promise));
+        if (pending.size >= STREAM_WINDOW) {
+            await Promise.race(pending);
+        }
+    }
+    await Promise.all(pending);
+    return adsk.fusionSendData("pointStreamEnd", JSON.stringify({stream: stream}));
+}
+
+function sendLoadedPointsToFusion() {
+    if (loadedPoints === null) {
+        setStatus("No points loaded yet");
+        return;
+    }
+    const points = loadedPoints;
+    sendPointsToFusion(points, "palette points").then(() =>
+        setStatus(`Sent ${points.length / 3} points to Fusion`)
     );
+}
 
+// ******** Local point files, read progressively without going through Fusion ********
+function loadSelectedFile() {
+    const file = document.getElementById("fileInput").files[0];
+    if (!file) {
+        return;
+    }
+    const load = /\.stplod$/i.test(file.name) ? loadLodFile : loadCsvFile;
+    load(file).catch((e) => setStatus(`Failed to load ${file.name}: ${e.message}`));
 }
 
-function updateMessage(messageString) {
-    // Message is sent from the add-in as a JSON string.
-    const messageData = JSON.parse(messageString);
+// Reads a LOD container level by level, so coarse levels are shown while the finer ones load.
+async function loadLodFile(file) {
+    const head = await file.slice(0, 16).arrayBuffer();
+    if (new TextDecoder().decode(head.slice(0, 8)) !== "STPLOD01") {
+        throw new Error("not a LOD container");
+    }
+    const view = new DataView(head);
+    const headerLength = view.getUint32(8, true) + view.getUint32(12, true) * 2 ** 32;
+    const header = JSON.parse(await file.slice(16, 16 + headerLength).text());
+    const dataOffset = 16 + headerLength;
 
-    // Update a paragraph with the data passed in.
-    document.getElementById("fusionMessage").innerHTML =
-        `<b>Your text</b>: ${messageData.myText} <br/>` +
-        `<b>Your expression</b>: ${messageData.myExpression} <br/>` +
-        `<b>Your value</b>: ${messageData.myValue}`;
+    const values = new Float32Array(header.count * 3);
+    viewer.load(values);
+    let cursor = 0;
+    for (const level of header.levels) {
+        for (const tile of level.tiles) {
+            const start = dataOffset + tile.offset;
+            const block = new Float64Array(await file.slice(start, start + tile.count * 24).arrayBuffer());
+            values.set(block, cursor);
+            cursor += block.length;
+        }
+        viewer.progress(values, cursor);
+        setStatus(`Loading ${file.name}: level ${level.level + 1} of ${header.levels.length}`);
+    }
+    viewer.finish(values, header.count);
+    loadedPoints = values;
+}
+
+// Parses a plain or gzip compressed CSV file as it is read.
+async function loadCsvFile(file) {
+    let stream = file.stream();
+    if (/\.gz$/i.test(file.name)) {
+        stream = stream.pipeThrough(new DecompressionStream("gzip"));
+    } else if (!/\.csv$/i.test(file.name)) {
+        throw new Error("only .csv, .csv.gz and .stplod files can be opened in the palette");
+    }
+    const reader = stream.pipeThrough(new TextDecoderStream()).getReader();
+
+    let values = new Float32Array(3 << 20);
+    let count = 0;
+    let rest = "";
+    viewer.load(values);
+    for (;;) {
+        const {done, value} = await reader.read();
+        const lines = (rest + (value || "")).split("\n");
+        rest = done ? "" : lines.pop();
+        for (const line of lines) {
+            const fields = line.split(",");
+            const x = parseFloat(fields[0]), y = parseFloat(fields[1]), z = parseFloat(fields[2]);
+            if (isNaN(x) || isNaN(y) || isNaN(z)) {
+                continue;
+            }
+            if (count + 3 > values.length) {
+                const grown = new Float32Array(values.length * 2);
+                grown.set(values);
+                values = grown;
+            }
+            values[count++] = x;
+            values[count++] = y;
+            values[count++] = z;
+        }
+        viewer.progress(values, count);
+        setStatus(`Loading ${file.name}: ${count / 3} points`);
+        if (done) {
+            break;
+        }
+    }
+    values = values.slice(0, count);
+    viewer.finish(values, count / 3);
+    loadedPoints = values;
 }
 
 window.fusionJavaScriptHandler = {
     handle: function (action, data) {
         try {
-            if (action === "updateMessage") {
-                updateMessage(data);
+            if (action === "pointStreamBegin") {
+                beginPointStream(data);
+            } else if (action === "pointStreamChunk") {
+                addPointStreamChunk(data);
+            } else if (action === "pointStreamEnd") {
+                endPointStream(data);
             } else if (action === "debugger") {
                 debugger;
             } else {
@@ -41,7 +226,7 @@ window.fusionJavaScriptHandler = {
             }
         } catch (e) {
             console.log(e);
-            console.log(`Exception caught with command: ${action}, data: ${data}`);
+            console.log(`Exception caught with command: ${action}`);
         }
         return "OK";
     },
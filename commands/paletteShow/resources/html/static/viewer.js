@@ -0,0 +1,466 @@
+// WebGL point cloud viewer.
+//
+// Points are kept in a single Float32Array of x, y, z values. While a cloud is
+// loading, the loaded prefix is drawn as it arrives. Once it is complete an
+// octree is built: every node keeps an evenly spaced sample of its points and
+// passes the rest to its children, and the points are reordered so each node
+// is a contiguous range of one vertex buffer. Each frame only the nodes inside
+// the view frustum are drawn, refined from the largest on screen down until
+// the point budget is reached.
+
+const NODE_CAPACITY = 16384;   // points kept in each octree node
+const MAX_DEPTH = 12;          // nodes at this depth keep all their points
+const POINT_BUDGET = 3000000;  // maximum points drawn per frame
+const MIN_NODE_PIXELS = 80;    // nodes smaller than this on screen are not refined
+
+const VERTEX_SHADER = `
+attribute vec3 position;
+uniform mat4 viewProjection;
+uniform vec3 origin;
+uniform float pointSize;
+uniform vec2 heightRange;
+varying float height;
+void main() {
+    vec3 local = position - origin;
+    gl_Position = viewProjection * vec4(local, 1.0);
+    gl_PointSize = pointSize;
+    height = (position.z - heightRange.x) / max(heightRange.y - heightRange.x, 1e-6);
+}`;
+
+const FRAGMENT_SHADER = `
+precision mediump float;
+varying float height;
+void main() {
+    vec3 low = vec3(0.15, 0.35, 0.9);
+    vec3 high = vec3(0.95, 0.45, 0.1);
+    gl_FragColor = vec4(mix(low, high, clamp(height, 0.0, 1.0)), 1.0);
+}`;
+
+// ******** Matrix helpers, column-major like WebGL ********
+function perspective(fovy, aspect, near, far) {
+    const f = 1 / Math.tan(fovy / 2);
+    const nf = 1 / (near - far);
+    return new Float32Array([
+        f / aspect, 0, 0, 0,
+        0, f, 0, 0,
+        0, 0, (far + near) * nf, -1,
+        0, 0, 2 * far * near * nf, 0,
+    ]);
+}
+
+function lookAt(eye, target, up) {
+    let zx = eye[0] - target[0], zy = eye[1] - target[1], zz = eye[2] - target[2];
+    let length = Math.hypot(zx, zy, zz) || 1;
+    zx /= length; zy /= length; zz /= length;
+    let xx = up[1] * zz - up[2] * zy, xy = up[2] * zx - up[0] * zz, xz = up[0] * zy - up[1] * zx;
+    length = Math.hypot(xx, xy, xz) || 1;
+    xx /= length; xy /= length; xz /= length;
+    const yx = zy * xz - zz * xy, yy = zz * xx - zx * xz, yz = zx * xy - zy * xx;
+    return new Float32Array([
+        xx, yx, zx, 0,
+        xy, yy, zy, 0,
+        xz, yz, zz, 0,
+        -(xx * eye[0] + xy * eye[1] + xz * eye[2]),
+        -(yx * eye[0] + yy * eye[1] + yz * eye[2]),
+        -(zx * eye[0] + zy * eye[1] + zz * eye[2]),
+        1,
+    ]);
+}
+
+function multiply(a, b) {
+    const out = new Float32Array(16);
+    for (let column = 0; column < 4; column++) {
+        for (let row = 0; row < 4; row++) {
+            let sum = 0;
+            for (let k = 0; k < 4; k++) {
+                sum += a[k * 4 + row] * b[column * 4 + k];
+            }
+            out[column * 4 + row] = sum;
+        }
+    }
+    return out;
+}
+
+// Returns the six planes [a, b, c, d] of the frustum of a view-projection matrix.
+function frustumPlanes(m) {
+    const planes = [];
+    for (let row = 0; row < 3; row++) {
+        for (const sign of [1, -1]) {
+            planes.push([
+                m[3] + sign * m[row],
+                m[7] + sign * m[4 + row],
+                m[11] + sign * m[8 + row],
+                m[15] + sign * m[12 + row],
+            ]);
+        }
+    }
+    return planes;
+}
+
+// Tests a box [min x, min y, min z, max x, max y, max z] against the frustum planes.
+function boxInFrustum(planes, box) {
+    for (const [a, b, c, d] of planes) {
+        const x = a >= 0 ? box[3] : box[0];
+        const y = b >= 0 ? box[4] : box[1];
+        const z = c >= 0 ? box[5] : box[2];
+        if (a * x + b * y + c * z + d < 0) {
+            return false;
+        }
+    }
+    return true;
+}
+
+function boundingBox(points, start, end, box) {
+    box = box || [Infinity, Infinity, Infinity, -Infinity, -Infinity, -Infinity];
+    for (let i = start * 3; i < end * 3; i += 3) {
+        for (let axis = 0; axis < 3; axis++) {
+            const value = points[i + axis];
+            if (value < box[axis]) box[axis] = value;
+            if (value > box[axis + 3]) box[axis + 3] = value;
+        }
+    }
+    return box;
+}
+
+// ******** Octree ********
+function buildOctree(points, count) {
+    const indices = new Uint32Array(count);
+    for (let i = 0; i < count; i++) {
+        indices[i] = i;
+    }
+    const scratch = new Uint32Array(count);
+    const ordered = new Float32Array(count * 3);
+    let cursor = 0;
+
+    function append(index) {
+        ordered[cursor * 3] = points[index * 3];
+        ordered[cursor * 3 + 1] = points[index * 3 + 1];
+        ordered[cursor * 3 + 2] = points[index * 3 + 2];
+        cursor++;
+    }
+
+    function octant(index, center) {
+        return (points[index * 3] >= center[0] ? 1 : 0) |
+            (points[index * 3 + 1] >= center[1] ? 2 : 0) |
+            (points[index * 3 + 2] >= center[2] ? 4 : 0);
+    }
+
+    function build(start, end, box, depth) {
+        const n = end - start;
+        const node = {box: box, offset: cursor, count: 0, children: []};
+        if (n <= NODE_CAPACITY || depth >= MAX_DEPTH) {
+            for (let i = start; i < end; i++) {
+                append(indices[i]);
+            }
+            node.count = n;
+            return node;
+        }
+
+        // Keep an evenly spaced sample in this node and bucket the rest by octant.
+        const center = [(box[0] + box[3]) / 2, (box[1] + box[4]) / 2, (box[2] + box[5]) / 2];
+        const step = n / NODE_CAPACITY;
+        const counts = new Uint32Array(8);
+        let sample = 0;
+        for (let i = start; i < end; i++) {
+            if (sample < NODE_CAPACITY && i === start + Math.floor(sample * step)) {
+                append(indices[i]);
+                sample++;
+                indices[i] = 0xffffffff;
+            } else {
+                counts[octant(indices[i], center)]++;
+            }
+        }
+        node.count = sample;
+
+        const offsets = new Uint32Array(8);
+        for (let o = 1; o < 8; o++) {
+            offsets[o] = offsets[o - 1] + counts[o - 1];
+        }
+        const fill = offsets.slice();
+        for (let i = start; i < end; i++) {
+            if (indices[i] !== 0xffffffff) {
+                scratch[start + fill[octant(indices[i], center)]++] = indices[i];
+            }
+        }
+        indices.set(scratch.subarray(start, start + n - sample), start);
+
+        for (let o = 0; o < 8; o++) {
+            if (counts[o] === 0) {
+                continue;
+            }
+            const childBox = [
+                o & 1 ? center[0] : box[0], o & 2 ? center[1] : box[1], o & 4 ? center[2] : box[2],
+                o & 1 ? box[3] : center[0], o & 2 ? box[4] : center[1], o & 4 ? box[5] : center[2],
+            ];
+            const childStart = start + offsets[o];
+            node.children.push(build(childStart, childStart + counts[o], childBox, depth + 1));
+        }
+        return node;
+    }
+
+    const box = boundingBox(points, 0, count);
+    const size = Math.max(box[3] - box[0], box[4] - box[1], box[5] - box[2]);
+    const cube = [box[0], box[1], box[2], box[0] + size, box[1] + size, box[2] + size];
+    const root = build(0, count, cube, 0);
+    return {root: root, points: ordered};
+}
+
+// ******** Viewer ********
+class PointCloudViewer {
+    constructor(canvas) {
+        this.canvas = canvas;
+        this.gl = canvas.getContext("webgl", {antialias: false});
+        if (!this.gl) {
+            throw new Error("WebGL is not available");
+        }
+        this.program = this.createProgram();
+        this.buffer = this.gl.createBuffer();
+        this.bufferCapacity = 0;
+        this.points = null;
+        this.loaded = 0;
+        this.octree = null;
+        this.box = null;
+        this.pointSize = 2;
+        this.drawnPoints = 0;
+        this.camera = {yaw: -Math.PI / 4, pitch: Math.PI / 6, distance: 10, target: [0, 0, 0]};
+        this.fovy = Math.PI / 4;
+        this.frameRequested = false;
+        this.onframe = null;
+        this.attachControls();
+    }
+
+    createProgram() {
+        const gl = this.gl;
+        const program = gl.createProgram();
+        for (const [type, source] of [[gl.VERTEX_SHADER, VERTEX_SHADER], [gl.FRAGMENT_SHADER, FRAGMENT_SHADER]]) {
+            const shader = gl.createShader(type);
+            gl.shaderSource(shader, source);
+            gl.compileShader(shader);
+            if (!gl.getShaderParameter(shader, gl.COMPILE_STATUS)) {
+                throw new Error(gl.getShaderInfoLog(shader));
+            }
+            gl.attachShader(program, shader);
+        }
+        gl.linkProgram(program);
+        if (!gl.getProgramParameter(program, gl.LINK_STATUS)) {
+            throw new Error(gl.getProgramInfoLog(program));
+        }
+        return program;
+    }
+
+    // Starts a new cloud. The values array may still be filling up, call
+    // progress as points arrive and finish once the cloud is complete.
+    load(values) {
+        this.points = values;
+        this.loaded = 0;
+        this.octree = null;
+        this.box = null;
+        this.bufferCapacity = 0;
+        this.requestFrame();
+    }
+
+    // Uploads the points loaded since the last call. The values array can be
+    // replaced by a larger one holding the same leading points.
+    progress(values, loadedValues) {
+        const gl = this.gl;
+        const first = this.box === null;
+        const loaded = Math.floor(loadedValues / 3);
+        gl.bindBuffer(gl.ARRAY_BUFFER, this.buffer);
+        if (values !== this.points || values.byteLength > this.bufferCapacity) {
+            this.points = values;
+            this.bufferCapacity = values.byteLength;
+            gl.bufferData(gl.ARRAY_BUFFER, values.byteLength, gl.STATIC_DRAW);
+            gl.bufferSubData(gl.ARRAY_BUFFER, 0, values.subarray(0, loaded * 3));
+        } else if (loaded > this.loaded) {
+            gl.bufferSubData(gl.ARRAY_BUFFER, this.loaded * 12, values.subarray(this.loaded * 3, loaded * 3));
+        }
+        this.box = boundingBox(values, this.loaded, loaded, this.box);
+        this.loaded = loaded;
+        if (first && loaded > 0) {
+            this.resetView();
+        }
+        this.requestFrame();
+    }
+
+    // Builds the octree of the complete cloud and switches to culled rendering.
+    finish(values, count) {
+        this.progress(values, count * 3);
+        this.octree = buildOctree(values, this.loaded);
+        const gl = this.gl;
+        gl.bindBuffer(gl.ARRAY_BUFFER, this.buffer);
+        gl.bufferData(gl.ARRAY_BUFFER, this.octree.points, gl.STATIC_DRAW);
+        this.bufferCapacity = this.octree.points.byteLength;
+        this.requestFrame();
+    }
+
+    resetView() {
+        if (this.box === null) {
+            return;
+        }
+        const box = this.box;
+        this.origin = [(box[0] + box[3]) / 2, (box[1] + box[4]) / 2, (box[2] + box[5]) / 2];
+        this.camera.target = [0, 0, 0];
+        this.camera.distance = Math.max(Math.hypot(box[3] - box[0], box[4] - box[1], box[5] - box[2]), 1e-6) * 1.2;
+        this.requestFrame();
+    }
+
+    setPointSize(size) {
+        this.pointSize = size;
+        this.requestFrame();
+    }
+
+    requestFrame() {
+        if (!this.frameRequested) {
+            this.frameRequested = true;
+            requestAnimationFrame(() => {
+                this.frameRequested = false;
+                this.render();
+            });
+        }
+    }
+
+    eye() {
+        const c = this.camera;
+        return [
+            c.target[0] + c.distance * Math.cos(c.pitch) * Math.cos(c.yaw),
+            c.target[1] + c.distance * Math.cos(c.pitch) * Math.sin(c.yaw),
+            c.target[2] + c.distance * Math.sin(c.pitch),
+        ];
+    }
+
+    render() {
+        const gl = this.gl;
+        const canvas = this.canvas;
+        const width = canvas.clientWidth * devicePixelRatio;
+        const height = canvas.clientHeight * devicePixelRatio;
+        if (canvas.width !== width || canvas.height !== height) {
+            canvas.width = width;
+            canvas.height = height;
+        }
+        gl.viewport(0, 0, canvas.width, canvas.height);
+        gl.clearColor(0.12, 0.12, 0.14, 1);
+        gl.clear(gl.COLOR_BUFFER_BIT | gl.DEPTH_BUFFER_BIT);
+        this.drawnPoints = 0;
+        if (this.box === null || this.loaded === 0) {
+            return;
+        }
+
+        const eye = this.eye();
+        const near = this.camera.distance / 1000;
+        const far = this.camera.distance * 10;
+        const projection = perspective(this.fovy, canvas.width / Math.max(canvas.height, 1), near, far);
+        const viewProjection = multiply(projection, lookAt(eye, this.camera.target, [0, 0, 1]));
+
+        gl.enable(gl.DEPTH_TEST);
+        gl.useProgram(this.program);
+        gl.bindBuffer(gl.ARRAY_BUFFER, this.buffer);
+        const position = gl.getAttribLocation(this.program, "position");
+        gl.enableVertexAttribArray(position);
+        gl.vertexAttribPointer(position, 3, gl.FLOAT, false, 0, 0);
+        gl.uniformMatrix4fv(gl.getUniformLocation(this.program, "viewProjection"), false, viewProjection);
+        gl.uniform3fv(gl.getUniformLocation(this.program, "origin"), this.origin);
+        gl.uniform1f(gl.getUniformLocation(this.program, "pointSize"), this.pointSize * devicePixelRatio);
+        gl.uniform2f(gl.getUniformLocation(this.program, "heightRange"), this.box[2], this.box[5]);
+
+        if (this.octree === null) {
+            // Still loading, draw the loaded prefix within the point budget.
+            this.drawnPoints = Math.min(this.loaded, POINT_BUDGET);
+            gl.drawArrays(gl.POINTS, 0, this.drawnPoints);
+        } else {
+            this.drawOctree(viewProjection, eye, canvas.height);
+        }
+        if (this.onframe) {
+            this.onframe(this);
+        }
+    }
+
+    drawOctree(viewProjection, eye, viewportHeight) {
+        const gl = this.gl;
+        const planes = frustumPlanes(viewProjection);
+        const pixelsPerUnit = viewportHeight / (2 * Math.tan(this.fovy / 2));
+        const origin = this.origin;
+
+        // Nodes are visited largest on screen first, so the budget goes to what is most visible.
+        const queue = [{node: this.octree.root, pixels: Infinity}];
+        while (queue.length > 0) {
+            const {node} = queue.pop();
+            const box = [
+                node.box[0] - origin[0], node.box[1] - origin[1], node.box[2] - origin[2],
+                node.box[3] - origin[0], node.box[4] - origin[1], node.box[5] - origin[2],
+            ];
+            if (!boxInFrustum(planes, box)) {
+                continue;
+            }
+            if (this.drawnPoints + node.count > POINT_BUDGET) {
+                break;
+            }
+            gl.drawArrays(gl.POINTS, node.offset, node.count);
+            this.drawnPoints += node.count;
+
+            for (const child of node.children) {
+                const b = child.box;
+                const radius = Math.hypot(b[3] - b[0], b[4] - b[1], b[5] - b[2]) / 2;
+                const distance = Math.hypot(
+                    (b[0] + b[3]) / 2 - origin[0] - eye[0],
+                    (b[1] + b[4]) / 2 - origin[1] - eye[1],
+                    (b[2] + b[5]) / 2 - origin[2] - eye[2]);
+                const pixels = distance > radius ? radius / distance * pixelsPerUnit : Infinity;
+                if (pixels < MIN_NODE_PIXELS) {
+                    continue;
+                }
+                // Keep the queue sorted ascending so pop returns the largest node.
+                let i = queue.length;
+                while (i > 0 && queue[i - 1].pixels > pixels) {
+                    i--;
+                }
+                queue.splice(i, 0, {node: child, pixels: pixels});
+            }
+        }
+    }
+
+    attachControls() {
+        const canvas = this.canvas;
+        let last = null;
+        canvas.addEventListener("contextmenu", (event) => event.preventDefault());
+        canvas.addEventListener("mousedown", (event) => {
+            last = [event.clientX, event.clientY, event.button === 0 && !event.shiftKey];
+        });
+        window.addEventListener("mouseup", () => {
+            last = null;
+        });
+        window.addEventListener("mousemove", (event) => {
+            if (last === null) {
+                return;
+            }
+            const dx = event.clientX - last[0];
+            const dy = event.clientY - last[1];
+            const c = this.camera;
+            if (last[2]) {
+                // Orbit
+                c.yaw -= dx * 0.01;
+                c.pitch = Math.max(-1.55, Math.min(1.55, c.pitch + dy * 0.01));
+            } else {
+                // Pan in the view plane
+                const scale = c.distance * 2 * Math.tan(this.fovy / 2) / Math.max(canvas.clientHeight, 1);
+                const right = [-Math.sin(c.yaw), Math.cos(c.yaw), 0];
+                const up = [
+                    -Math.sin(c.pitch) * Math.cos(c.yaw),
+                    -Math.sin(c.pitch) * Math.sin(c.yaw),
+                    Math.cos(c.pitch),
+                ];
+                for (let axis = 0; axis < 3; axis++) {
+                    c.target[axis] += (-dx * right[axis] + dy * up[axis]) * scale;
+                }
+            }
+            last[0] = event.clientX;
+            last[1] = event.clientY;
+            this.requestFrame();
+        });
+        canvas.addEventListener("wheel", (event) => {
+            event.preventDefault();
+            this.camera.distance *= Math.exp(event.deltaY * 0.001);
+            this.requestFrame();
+        }, {passive: false});
+        window.addEventListener("resize", () => this.requestFrame());
+    }
+}
@@ -0,0 +1,24 @@
+# Command identity and button location. This module is imported when the add-in
+# starts to create the command button, entry.py is only imported the first time
+# the command is run, see commands/__init__.py.
+import os
+from ... import config
+
+# TODO *** Specify the command identity information. ***
+CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_surfaceToCsv'
+CMD_NAME = 'Surface to Points'
+CMD_Description = 'Exports a surface as coodinates in a CSV file, based on a mesh.'
+
+# Specify that the command will be promoted to the panel.
+IS_PROMOTED = True
+
+# TODO *** Define the location where the command button will be created. ***
+# This is done by specifying the workspace, the tab, and the panel, and the 
+# command it will be inserted beside. Not providing the command to position it
+# will insert it at the end.
+WORKSPACE_ID = 'FusionSolidEnvironment'
+PANEL_ID = 'SolidScriptsAddinsPanel'
+COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
+
+# Resource location for command icons, here we assume a sub folder in this directory named "resources".
+ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
@@ -1,86 +1,30 @@
 import adsk.core
 import adsk.fusion
-import os
-import tkinter
-from tkinter import filedialog
 import csv
 import traceback
 from ...lib import fusion360utils as futil
-from ... import config
+from ...lib import pointutils
+from . import CMD_ID, CMD_NAME
 
 app = adsk.core.Application.get()
 ui = app.userInterface
-tkinter.Tk().withdraw()
 
+# Number of levels of detail written to a LOD container export.
+LOD_LEVELS = 4
 
-# TODO *** Specify the command identity information. ***
-CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_surfaceToCsv'
-CMD_NAME = 'Surface to Points'
-CMD_Description = 'Exports a surface as coodinates in a CSV file, based on a mesh.'
-
-# Specify that the command will be promoted to the panel.
-IS_PROMOTED = True
-
-# TODO *** Define the location where the command button will be created. ***
-# This is done by specifying the workspace, the tab, and the panel, and the 
-# command it will be inserted beside. Not providing the command to position it
-# will insert it at the end.
-WORKSPACE_ID = 'FusionSolidEnvironment'
-PANEL_ID = 'SolidScriptsAddinsPanel'
-COMMAND_BESIDE_ID = 'ScriptsManagerCommand'
-
-# Resource location for command icons, here we assume a sub folder in this directory named "resources".
-ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', '')
-
-# Local list of event handlers used to maintain a reference, so
-# they are not released and garbage collected.
-local_handlers = []
-
-
-# Executed when add-in is run.
-def start():
-    # Create a command Definition.
-    cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
-
-    # Define an event handler for the command created event. It will be called when the button is clicked.
-    futil.add_handler(cmd_def.commandCreated, command_created)
-
-    # ******** Add a button into the UI so the user can run the command. ********
-    # Get the target workspace the button will be created in.
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-
-    # Get the panel the button will be created in.
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-
-    # Create the button command control in the UI after the specified existing command.
-    control = panel.controls.addCommand(cmd_def, COMMAND_BESIDE_ID, False)
-
-    # Specify if the command is promoted to the main toolbar. 
-    control.isPromoted = IS_PROMOTED
-
-
-# Executed when add-in is stopped.
-def stop():
-    # Get the various UI elements for this command
-    workspace = ui.workspaces.itemById(WORKSPACE_ID)
-    panel = workspace.toolbarPanels.itemById(PANEL_ID)
-    command_control = panel.controls.itemById(CMD_ID)
-    command_definition = ui.commandDefinitions.itemById(CMD_ID)
-
-    # Delete the button command control
-    if command_control:
-        command_control.deleteMe()
-
-    # Delete the command definition
-    if command_definition:
-        command_definition.deleteMe()
+# Approximate memory used per coordinate of a tessellation while a streaming export
+# buffers it: the float list returned by the mesh calculator and its array copy.
+STREAMING_COORDINATE_SIZE = 40
 
 
 # Function that is called when a user clicks the corresponding button in the UI.
 # This defines the contents of the command dialog and connects to the command related events.
 def command_created(args: adsk.core.CommandCreatedEventArgs):
+    # Release any handlers left by a previous instance of this command
+    futil.clear_handlers(CMD_ID)
+
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Created Event')
+    futil.logf('%s Command Created Event', CMD_NAME)
 
     # https://help.autodesk.com/view/fusion360/ENU/?contextId=CommandInputs
     inputs = args.command.commandInputs
@@ -99,19 +43,43 @@ def command_created(args: adsk.core.CommandCreatedEventArgs):
     quality_input.listItems.add('High', False, '')
     quality_input.listItems.add('Very High', True, '')
 
+    # Create a Dropdown Command Input for the output format
+    format_input = inputs.addDropDownCommandInput('format_input', 'Output format',
+                                                  adsk.core.DropDownStyles.TextListDropDownStyle)
+    format_input.listItems.add('CSV', True, '')
+    format_input.listItems.add('LOD container', False, '')
+
+    # Create a Dropdown Command Input for output compression
+    compression_input = inputs.addDropDownCommandInput('compression_input', 'Compression',
+                                                       adsk.core.DropDownStyles.TextListDropDownStyle)
+    compression_input.listItems.add('None', True, '')
+    for compression in pointutils.COMPRESSION_TYPES:
+        compression_input.listItems.add(compression, False, '')
+
+    # Create a Boolean Command Input for incremental export
+    inputs.addBoolValueInput('incremental_input', 'Incremental export', True, '', False)
+
+    # Create the inputs for the memory bounded streaming export
+    streaming_input = inputs.addBoolValueInput('streaming_input', 'Streaming export', True, '', False)
+    streaming_input.tooltip = ('Tessellates and writes the faces group by group so memory stays under the cap. '
+                               'Faces are tessellated one by one, so the points match an incremental export '
+                               'and differ from the default whole body tessellation. No mesh body is created.')
+    memory_input = inputs.addIntegerSpinnerCommandInput('memory_input', 'Memory cap (MB)', 16, 65536, 16, 256)
+    memory_input.isVisible = False
+
     # TODO Connect to the events that are needed by this command.
-    futil.add_handler(args.command.execute, command_execute, local_handlers=local_handlers)
-    futil.add_handler(args.command.inputChanged, command_input_changed, local_handlers=local_handlers)
-    futil.add_handler(args.command.executePreview, command_preview, local_handlers=local_handlers)
-    futil.add_handler(args.command.validateInputs, command_validate_input, local_handlers=local_handlers)
-    futil.add_handler(args.command.destroy, command_destroy, local_handlers=local_handlers)
+    futil.add_handler(args.command.execute, command_execute, scope=CMD_ID)
+    futil.add_handler(args.command.inputChanged, command_input_changed, scope=CMD_ID)
+    futil.add_handler(args.command.executePreview, command_preview, scope=CMD_ID)
+    futil.add_handler(args.command.validateInputs, command_validate_input, scope=CMD_ID)
+    futil.add_handler(args.command.destroy, command_destroy, scope=CMD_ID)
 
 
 # This event handler is called when the user clicks the OK button in the command dialog or 
 # is immediately called after the created event not command inputs were created for the dialog.
 def command_execute(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Execute Event')
+    futil.logf('%s Command Execute Event', CMD_NAME)
 
     # TODO ******************************** Your code here ********************************
     try:
@@ -136,6 +104,16 @@ def command_execute(args: adsk.core.CommandEventArgs):
         surface: adsk.fusion.BRepBody = surface_input.selection(0).entity
         quality_input: adsk.core.DropDownCommandInput = inputs.itemById('quality_input')
         quality_level = mesh_quality_options[quality_input.selectedItem.index]
+        format_input: adsk.core.DropDownCommandInput = inputs.itemById('format_input')
+        export_lod = format_input.selectedItem.index == 1
+        compression_input: adsk.core.DropDownCommandInput = inputs.itemById('compression_input')
+        compression = None
+        if compression_input.selectedItem.index > 0:
+            compression = pointutils.COMPRESSION_TYPES[compression_input.selectedItem.index - 1]
+        incremental_input: adsk.core.BoolValueCommandInput = inputs.itemById('incremental_input')
+        incremental = incremental_input.value
+        streaming_input: adsk.core.BoolValueCommandInput = inputs.itemById('streaming_input')
+        memory_input: adsk.core.IntegerSpinnerCommandInput = inputs.itemById('memory_input')
 
         # Get control surface faces
         faces = []
@@ -143,27 +121,83 @@ def command_execute(args: adsk.core.CommandEventArgs):
             faces.append(surface.faces.item(i))
         debug_info += f'The selected surface has: {surface.faces.count} faces.'
 
+        # Ask for the output folder
+        folder_dialog = ui.createFolderDialog()
+        folder_dialog.title = 'Select the output folder'
+        if folder_dialog.showDialog() != adsk.core.DialogResults.DialogOK:
+            return
+        folder_path = folder_dialog.folder
+        base_path = folder_path + '/surface_points'
+
+        if streaming_input.value:
+            # Write the points face group by face group, without the mesh body
+            extension = '.csv' + (pointutils.COMPRESSION_EXTENSIONS[compression] if compression else '')
+            file_path = base_path + extension
+            scale = units_manager.convert(1, 'cm', units_manager.defaultLengthUnits)
+            group_count, peak_size = _stream_points(file_path, compression, faces, quality_level, scale,
+                                                    memory_input.value << 20)
+            debug_info += (f'<br><br>Streamed {len(faces)} faces in {group_count} groups with '
+                           f'{quality_input.selectedItem.name} quality.')
+            debug_info += f'<br>Estimated peak buffer size: {peak_size / (1 << 20):.1f} MB.'
+            debug_info += ('<br>The faces were tessellated one by one, the points match an incremental export '
+                           'rather than the default whole body export.')
+            debug_info += f'<br><br>Exported CSV file: "{file_path}".'
+            ui.messageBox(debug_info)
+            return
+
         # Create Mesh
-        mesh_calc = surface.meshManager.createMeshCalculator()
-        mesh_calc.setQuality(quality_level)
-        t_mesh = mesh_calc.calculate()
-        t_mesh_coordinates = t_mesh.nodeCoordinatesAsDouble
-        t_mesh_indices = t_mesh.nodeIndices
-        t_mesh_vector = t_mesh.normalVectorsAsDouble
+        if incremental:
+            # Re-tessellate only the faces whose geometry changed since the last export
+            manifest = pointutils.ExportManifest(base_path, {'quality': quality_input.selectedItem.name})
+            face_meshes = {}
+            changed_meshes = []
+            for face in faces:
+                face_fingerprint = _face_fingerprint(face)
+                face_mesh = manifest.get(face_fingerprint)
+                if face_mesh is None:
+                    face_mesh = _calculate_face_mesh(face, quality_level)
+                    changed_meshes.append(face_mesh)
+                face_meshes[face_fingerprint] = face_mesh
+            merged_mesh = pointutils.merge_face_meshes(face_meshes.values())
+            t_mesh_coordinates = list(merged_mesh.coordinates)
+            t_mesh_indices = list(merged_mesh.indices)
+            t_mesh_vector = list(merged_mesh.normals)
+            debug_info += f'<br><br>Re-tessellated faces: {len(changed_meshes)} of {len(faces)}.'
+        else:
+            mesh_calc = surface.meshManager.createMeshCalculator()
+            mesh_calc.setQuality(quality_level)
+            t_mesh = mesh_calc.calculate()
+            t_mesh_coordinates = t_mesh.nodeCoordinatesAsDouble
+            t_mesh_indices = t_mesh.nodeIndices
+            t_mesh_vector = t_mesh.normalVectorsAsDouble
         surface_mesh = mesh_bodies.addByTriangleMeshData(t_mesh_coordinates, t_mesh_indices, t_mesh_vector, [])
         debug_info += f'<br><br>Mesh generated with {quality_input.selectedItem.name} quality.'
 
-        # Export points in csv file
-        folder_path = filedialog.askdirectory()
-        t_mesh_point = t_mesh.nodeCoordinates
-        with open(folder_path + '/surface_points.csv', 'w', newline='') as file:
-            writer = csv.writer(file)
-            for p in t_mesh_point:
-                x = units_manager.convert(p.x, 'cm', units_manager.defaultLengthUnits)
-                y = units_manager.convert(p.y, 'cm', units_manager.defaultLengthUnits)
-                z = units_manager.convert(p.z, 'cm', units_manager.defaultLengthUnits)
-                writer.writerow([x, y, z])
-        debug_info += f'<br><br>Exported CSV file: "{file.name}".'
+        # Export points in the selected folder, converted to the default length units
+        scale = units_manager.convert(1, 'cm', units_manager.defaultLengthUnits)
+        if export_lod:
+            # Export points in a LOD container, decimated from this single tessellation
+            file_path = base_path + pointutils.LOD_EXTENSION
+            lod_coordinates = [c * scale for c in t_mesh_coordinates]
+            lod_header = pointutils.write_lod(file_path, lod_coordinates, LOD_LEVELS)
+            level_counts = ', '.join(str(level['count']) for level in lod_header['levels'])
+            debug_info += f'<br><br>Exported LOD container: "{file_path}".'
+            debug_info += f'<br>Points added per level: {level_counts}.'
+        else:
+            # Export points in csv file, compression runs in a background thread
+            extension = '.csv' + (pointutils.COMPRESSION_EXTENSIONS[compression] if compression else '')
+            file_path = base_path + extension
+            _write_points(file_path, compression, [t_mesh_coordinates], scale)
+            debug_info += f'<br><br>Exported CSV file: "{file_path}".'
+            if incremental:
+                # Export the points of the re-tessellated faces only
+                delta_path = base_path + '.delta' + extension
+                _write_points(delta_path, compression, [m.coordinates for m in changed_meshes], scale)
+                debug_info += f'<br>Exported delta file: "{delta_path}".'
+
+        # Remember the face tessellations for the next incremental export
+        if incremental:
+            manifest.save(face_meshes)
 
         # Show Message
         ui.messageBox(debug_info)
@@ -173,10 +207,92 @@ def command_execute(args: adsk.core.CommandEventArgs):
             ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
 
+# Returns a fingerprint of the face geometry used to find unchanged faces between exports.
+def _face_fingerprint(face: adsk.fusion.BRepFace) -> str:
+    values = [face.geometry.surfaceType, face.isParamReversed, face.area, face.edges.count]
+    box = face.boundingBox
+    for point in (box.minPoint, box.maxPoint, face.centroid, face.pointOnFace):
+        values += [point.x, point.y, point.z]
+    for i in range(face.vertices.count):
+        point = face.vertices.item(i).geometry
+        values += [point.x, point.y, point.z]
+    return pointutils.fingerprint(values)
+
+
+# Tessellates a single face.
+def _calculate_face_mesh(face: adsk.fusion.BRepFace, quality_level) -> pointutils.FaceMesh:
+    mesh_calc = face.meshManager.createMeshCalculator()
+    mesh_calc.setQuality(quality_level)
+    t_mesh = mesh_calc.calculate()
+    return pointutils.FaceMesh(t_mesh.nodeCoordinatesAsDouble, t_mesh.nodeIndices, t_mesh.normalVectorsAsDouble)
+
+
+# Writes flat coordinate sequences as x, y, z rows scaled from centimeters to the output units.
+def _write_points(file_path: str, compression: str, coordinate_blocks, scale: float):
+    with pointutils.open_points_writer(file_path, compression) as file:
+        writer = csv.writer(file)
+        for coordinates in coordinate_blocks:
+            _write_rows(writer, coordinates, scale)
+
+
+def _write_rows(writer, coordinates, scale: float):
+    for i in range(0, len(coordinates), 3):
+        writer.writerow([coordinates[i] * scale,
+                         coordinates[i + 1] * scale,
+                         coordinates[i + 2] * scale])
+
+
+# Tessellates the faces one at a time and writes their new nodes, buffered in groups
+# written whenever the estimated memory reaches memory_cap bytes. The nodes shared with
+# previous faces are dropped, so the rows are the ones of an incremental export. They differ
+# from the default export, which tessellates the whole body at once: a known limitation,
+# since a body tessellation cannot be computed face group by face group.
+# Returns the number of groups written and the estimated peak memory in bytes.
+def _stream_points(file_path: str, compression: str, faces: list, quality_level, scale: float,
+                   memory_cap: int) -> tuple:
+    node_filter = pointutils.FaceNodeFilter()
+    group = []
+    group_size = 0
+    group_count = 0
+    peak_size = 0
+    with pointutils.open_points_writer(file_path, compression) as file:
+        writer = csv.writer(file)
+        for face in faces:
+            face_mesh = _calculate_face_mesh(face, quality_level)
+            face_size = (len(face_mesh.coordinates) + len(face_mesh.normals) +
+                         len(face_mesh.indices)) * STREAMING_COORDINATE_SIZE
+            group.append(node_filter.add(face_mesh))
+            del face_mesh
+            group_size += len(group[-1]) * STREAMING_COORDINATE_SIZE
+            peak_size = max(peak_size, group_size + face_size + node_filter.memory_size)
+
+            # Write the group before a next face of the same size could push it over the cap
+            if group_size + 2 * face_size + node_filter.memory_size >= memory_cap:
+                for coordinates in group:
+                    _write_rows(writer, coordinates, scale)
+                group = []
+                group_size = 0
+                group_count += 1
+        if group:
+            for coordinates in group:
+                _write_rows(writer, coordinates, scale)
+            group_count += 1
+
+    if peak_size > memory_cap:
+        if node_filter.memory_size >= memory_cap:
+            cause = f'the face boundary nodes alone take {node_filter.memory_size / (1 << 20):.1f} MB'
+        else:
+            cause = 'a single face is too large'
+        futil.logf('%s: Streaming export peaked at %.1f MB, over the %.1f MB cap because %s',
+                   CMD_NAME, peak_size / (1 << 20), memory_cap / (1 << 20), cause,
+                   level=adsk.core.LogLevels.WarningLogLevel)
+    return group_count, peak_size
+
+
 # This event handler is called when the command needs to compute a new preview in the graphics window.
 def command_preview(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Preview Event')
+    futil.logf('%s Command Preview Event', CMD_NAME)
     inputs = args.command.commandInputs
 
 
@@ -187,22 +303,37 @@ def command_input_changed(args: adsk.core.InputChangedEventArgs):
     inputs = args.inputs
 
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Input Changed Event fired from a change to {changed_input.id}')
+    futil.logf('%s Input Changed Event fired from a change to %s', CMD_NAME, changed_input.id)
+
+    # A streaming export writes a CSV file only and keeps no face tessellations.
+    if changed_input.id == 'streaming_input':
+        streaming = inputs.itemById('streaming_input').value
+        inputs.itemById('memory_input').isVisible = streaming
+        inputs.itemById('incremental_input').isEnabled = not streaming
+        format_input: adsk.core.DropDownCommandInput = inputs.itemById('format_input')
+        if streaming:
+            format_input.listItems.item(0).isSelected = True
+        format_input.isEnabled = not streaming
+
+    # LOD containers are indexed by byte offset and are never compressed.
+    if changed_input.id in ('format_input', 'streaming_input'):
+        format_input: adsk.core.DropDownCommandInput = inputs.itemById('format_input')
+        inputs.itemById('compression_input').isEnabled = format_input.selectedItem.index == 0
 
 
 # This event handler is called when the user interacts with any of the inputs in the dialog
 # which allows you to verify all the inputs are valid and enables the OK button.
 def command_validate_input(args: adsk.core.ValidateInputsEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Validate Input Event')
+    futil.logf('%s Validate Input Event', CMD_NAME)
 
     inputs = args.inputs
-        
+
 
 # This event handler is called when the command terminates.
 def command_destroy(args: adsk.core.CommandEventArgs):
     # General logging for debug.
-    futil.log(f'{CMD_NAME} Command Destroy Event')
+    futil.logf('%s Command Destroy Event', CMD_NAME)
 
-    global local_handlers
-    local_handlers = []
+    # Release the event handlers of this command instance
+    futil.clear_handlers(CMD_ID)
@@ -17,5 +17,15 @@ DEBUG = True
 ADDIN_NAME = os.path.basename(os.path.dirname(__file__))
 COMPANY_NAME = 'DM'
 
+# Time budget for creating the command buttons when the add-in starts. Command
+# implementations are imported lazily, so exceeding it usually means a heavy
+# import slipped into a command package __init__.py.
+STARTUP_BUDGET_MS = 100
+
+# Per-user folder of the checkpoints of resumable point imports, and of their
+# quarantine files when the folder of the imported file is not writable.
+IMPORT_JOBS_FOLDER = os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')),
+                                  ADDIN_NAME, 'import_jobs')
+
 # Palettes
 sample_palette_id = f'{COMPANY_NAME}_{ADDIN_NAME}_palette_id'
\ No newline at end of file
@@ -10,54 +10,113 @@
 #  UNINTERRUPTED OR ERROR FREE.
 
 import sys
+import time
 from typing import Callable
 
 import adsk.core
-from .general_utils import handle_error
+from .general_utils import handle_error, logf
 
 
 # Global Variable to hold Event Handlers
 _handlers = []
 
+# Event handlers owned by a scope, such as a running command, by scope name.
+_scoped_handlers = {}
+
+# Handler classes are defined once per handler type and shared by all handlers.
+_handler_classes = {}
+
+# Dispatch statistics by handler name.
+_handler_stats = {}
+
+# Callbacks taking longer than this are logged as warnings.
+SLOW_HANDLER_MS = 200
+
+
+class HandlerStats:
+    """Number of calls and cumulative and maximum duration of an event handler."""
+
+    __slots__ = ('name', 'calls', 'total_time', 'max_time')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, duration: float):
+        self.calls += 1
+        self.total_time += duration
+        if duration > self.max_time:
+            self.max_time = duration
+
 
 def add_handler(
         event: adsk.core.Event,
         callback: Callable,
         *,
         name: str = None,
-        local_handlers: list = None
+        local_handlers: list = None,
+        scope: str = None
 ):
     """Adds an event handler to the specified event.
 
     Arguments:
     event -- The event object you want to connect a handler to.
     callback -- The function that will handle the event.
-    name -- A name to use in logging errors associated with this event.
-            Otherwise the name of the event object is used. This argument
+    name -- A name to use in logging errors and timing associated with this event.
+            Otherwise the qualified name of the callback is used. This argument
             must be specified by its keyword.
     local_handlers -- A list of handlers you manage that is used to maintain
                       a reference to the handlers so they aren't released.
-                      This argument must be specified by its keyword. If not
-                      specified the handler is added to a global list and can
-                      be cleared using the clear_handlers function. You may want
-                      to maintain your own handler list so it can be managed 
-                      independently for each command.
+                      This argument must be specified by its keyword.
+    scope -- The name of the scope owning the handler, typically the command id
+             for the handlers of a running command. The handlers of a scope are
+             released together with clear_handlers(scope). This argument must be
+             specified by its keyword. If neither local_handlers nor scope are
+             specified the handler is added to a global list and can be cleared
+             using the clear_handlers function.
 
     :returns:
         The event handler that was created.  You don't often need this reference, but it can be useful in some cases.
     """   
     module = sys.modules[event.__module__]
     handler_type = module.__dict__[event.add.__annotations__['handler']]
-    handler = _create_handler(handler_type, callback, event, name, local_handlers)
+    handler = _create_handler(handler_type, callback, event, name, local_handlers, scope)
     event.add(handler)
     return handler
 
 
-def clear_handlers():
-    """Clears the global list of handlers.
+def clear_handlers(scope: str = None):
+    """Clears the handlers of a scope, or the global list and every scope.
+
+    Arguments:
+    scope -- The scope whose handlers are released. If not specified the global
+             list of handlers and the handlers of all scopes are cleared.
     """
     global _handlers
+    if scope is not None:
+        _scoped_handlers.pop(scope, None)
+        return
     _handlers = []
+    _scoped_handlers.clear()
+
+
+def get_handler_stats() -> list:
+    """Returns the dispatch statistics of every handler, slowest cumulative time first."""
+    return sorted(_handler_stats.values(), key=lambda stats: stats.total_time, reverse=True)
+
+
+def format_handler_stats(count: int = 20) -> str:
+    """Returns a table of the dispatch statistics of the slowest handlers.
+
+    Arguments:
+    count -- The maximum number of handlers to include.
+    """
+    lines = [f'{"calls":>8} {"total ms":>10} {"max ms":>9}  handler']
+    for stats in get_handler_stats()[:count]:
+        lines.append(f'{stats.calls:>8} {stats.total_time * 1000:>10.1f} {stats.max_time * 1000:>9.1f}  {stats.name}')
+    return '\n'.join(lines)
 
 
 def _create_handler(
@@ -65,24 +124,46 @@ def _create_handler(
         callback: Callable,
         event: adsk.core.Event,
         name: str = None,
-        local_handlers: list = None
+        local_handlers: list = None,
+        scope: str = None
 ):
-    handler = _define_handler(handler_type, callback, name)()
-    (local_handlers if local_handlers is not None else _handlers).append(handler)
+    name = name or f'{callback.__module__}.{callback.__qualname__}'
+    stats = _handler_stats.get(name)
+    if stats is None:
+        stats = _handler_stats[name] = HandlerStats(name)
+    handler = _define_handler(handler_type)(callback, stats)
+    if local_handlers is not None:
+        local_handlers.append(handler)
+    elif scope is not None:
+        _scoped_handlers.setdefault(scope, []).append(handler)
+    else:
+        _handlers.append(handler)
     return handler
 
 
-def _define_handler(handler_type, callback, name: str = None):
-    name = name or handler_type.__name__
+def _define_handler(handler_type):
+    handler_class = _handler_classes.get(handler_type)
+    if handler_class is not None:
+        return handler_class
 
     class Handler(handler_type):
-        def __init__(self):
+        def __init__(self, callback: Callable, stats: HandlerStats):
             super().__init__()
+            self.callback = callback
+            self.stats = stats
 
         def notify(self, args):
+            start = time.perf_counter()
             try:
-                callback(args)
+                self.callback(args)
             except:
-                handle_error(name)
-
+                handle_error(self.stats.name)
+            finally:
+                duration = time.perf_counter() - start
+                self.stats.record(duration)
+                if duration * 1000 > SLOW_HANDLER_MS:
+                    logf('Slow event handler %s took %.1f ms', self.stats.name, duration * 1000,
+                         level=adsk.core.LogLevels.WarningLogLevel)
+
+    _handler_classes[handler_type] = Handler
     return Handler
@@ -9,7 +9,9 @@
 #  AUTODESK, INC. DOES NOT WARRANT THAT THE OPERATION OF THE PROGRAM WILL BE
 #  UNINTERRUPTED OR ERROR FREE.
 
+import collections
 import os
+import time
 import traceback
 import adsk.core
 
@@ -23,27 +25,112 @@ try:
 except:
     DEBUG = False
 
+# Number of log events kept in memory for post-mortems, see dump_log.
+LOG_BUFFER_SIZE = 2000
+
+# Messages for the Text Command window are written in batches of LOG_FLUSH_SIZE
+# messages, or on the first log call after LOG_FLUSH_INTERVAL seconds.
+LOG_FLUSH_SIZE = 50
+LOG_FLUSH_INTERVAL = 1.0
+
+_LEVEL_NAMES = {
+    adsk.core.LogLevels.InfoLogLevel: 'INFO',
+    adsk.core.LogLevels.WarningLogLevel: 'WARNING',
+    adsk.core.LogLevels.ErrorLogLevel: 'ERROR',
+}
+_LEVEL_SEVERITIES = {
+    adsk.core.LogLevels.InfoLogLevel: 0,
+    adsk.core.LogLevels.WarningLogLevel: 1,
+    adsk.core.LogLevels.ErrorLogLevel: 2,
+}
+
+# Ring buffer of (time, level, message, args) tuples, formatted only when read.
+_log_events = collections.deque(maxlen=LOG_BUFFER_SIZE)
+_console_events = []
+_last_flush = time.monotonic()
+
 
 def log(message: str, level: adsk.core.LogLevels = adsk.core.LogLevels.InfoLogLevel, force_console: bool = False):
     """Utility function to easily handle logging in your app.
 
+    Every event is recorded in an in-memory ring buffer, see dump_log.
+
     Arguments:
     message -- The message to log.
     level -- The logging severity level.
     force_console -- Forces the message to be written to the Text Command window. 
-    """    
-    # Always print to console, only seen through IDE.
-    print(message)  
+    """
+    _record(message, (), level, force_console)
+
+
+def logf(message: str, *args, level: adsk.core.LogLevels = adsk.core.LogLevels.InfoLogLevel,
+         force_console: bool = False):
+    """Logs a %-style message formatted with args only when it is written out.
+
+    Use it instead of formatting the message for log in hot event handlers.
+
+    Arguments:
+    message -- The %-style format string.
+    args -- Values formatted into the message when it is written out.
+    level -- The logging severity level. This argument must be specified by its keyword.
+    force_console -- Forces the message to be written to the Text Command window.
+                     This argument must be specified by its keyword.
+    """
+    _record(message, args, level, force_console)
+
+
+def _record(message: str, args: tuple, level: adsk.core.LogLevels, force_console: bool):
+    event = (time.time(), level, message, args)
+    _log_events.append(event)
 
     # Log all errors to Fusion log file.
     if level == adsk.core.LogLevels.ErrorLogLevel:
-        log_type = adsk.core.LogTypes.FileLogType
-        app.log(message, level, log_type)
+        app.log(_format_message(message, args), level, adsk.core.LogTypes.FileLogType)
 
-    # If config.DEBUG is True write all log messages to the console.
+    # If config.DEBUG is True write all log messages to the console, in batches.
     if DEBUG or force_console:
-        log_type = adsk.core.LogTypes.ConsoleLogType
-        app.log(message, level, log_type)
+        _console_events.append(event)
+        if (level != adsk.core.LogLevels.InfoLogLevel or len(_console_events) >= LOG_FLUSH_SIZE
+                or time.monotonic() - _last_flush >= LOG_FLUSH_INTERVAL):
+            flush_log()
+
+
+def flush_log():
+    """Writes the pending console messages to the Text Command window in a single call."""
+    global _console_events, _last_flush
+    _last_flush = time.monotonic()
+    if not _console_events:
+        return
+    events, _console_events = _console_events, []
+    text = '\n'.join(_format_message(message, args) for _, _, message, args in events)
+    level = max((level for _, level, _, _ in events), key=lambda level: _LEVEL_SEVERITIES.get(level, 0))
+
+    # Print to console, only seen through IDE.
+    print(text)
+    app.log(text, level, adsk.core.LogTypes.ConsoleLogType)
+
+
+def dump_log(count: int = 100) -> str:
+    """Returns the last log events, oldest first, one formatted line per event.
+
+    Arguments:
+    count -- The maximum number of events to return.
+    """
+    events = list(_log_events)[-count:] if count > 0 else []
+    lines = []
+    for timestamp, level, message, args in events:
+        stamp = time.strftime('%H:%M:%S', time.localtime(timestamp)) + f'.{int(timestamp * 1000) % 1000:03d}'
+        lines.append(f'{stamp} {_LEVEL_NAMES.get(level, level)} {_format_message(message, args)}')
+    return '\n'.join(lines)
+
+
+def _format_message(message: str, args: tuple) -> str:
+    if not args:
+        return message
+    try:
+        return message % args
+    except (TypeError, ValueError):
+        return f'{message} {args}'
 
 
 def handle_error(name: str, show_message_box: bool = False):
@@ -56,8 +143,8 @@ def handle_error(name: str, show_message_box: bool = False):
                         and logged to the log file.                        
     """    
 
-    log('===== Error =====', adsk.core.LogLevels.ErrorLogLevel)
-    log(f'{name}\n{traceback.format_exc()}', adsk.core.LogLevels.ErrorLogLevel)
+    log('===== Error =====', level=adsk.core.LogLevels.ErrorLogLevel)
+    logf('%s\n%s', name, traceback.format_exc(), level=adsk.core.LogLevels.ErrorLogLevel)
 
     # If desired you could show an error as a message box.
     if show_message_box:
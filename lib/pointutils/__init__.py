@@ -0,0 +1,9 @@
+from .compression import *
+from .lod import *
+from .facecache import *
+from .pointfile import *
+from .parallel import *
+from .spatial import *
+from .fitting import *
+from .importjob import *
+from .transport import *
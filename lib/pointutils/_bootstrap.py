@@ -0,0 +1,48 @@
+# Loads the pointutils package under a top level name unique to its folder, without
+# changing sys.path, so worker processes can unpickle functions of this add-in's copy
+# without clashing with a 'pointutils' module of another add-in.
+#
+# Imported by the parallel module in the add-in process, and run with runpy.run_path
+# in each worker process before any task is unpickled.
+#
+# This module must not import adsk, it is also run by the worker processes.
+
+import hashlib
+import importlib.util
+import os
+import sys
+
+
+def package_name(folder: str) -> str:
+    """Returns the unique top level name of the pointutils package in a folder.
+
+    Arguments:
+    folder -- The pointutils package folder.
+    """
+    digest = hashlib.sha1(os.path.normcase(os.path.abspath(folder)).encode('utf-8')).hexdigest()
+    return f'_pointutils_{digest[:12]}'
+
+
+def load_package(folder: str):
+    """Imports the pointutils package in a folder under its unique name, once per process.
+
+    Arguments:
+    folder -- The pointutils package folder.
+    """
+    name = package_name(folder)
+    package = sys.modules.get(name)
+    if package is None:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(folder, '__init__.py'),
+                                                      submodule_search_locations=[folder])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[name] = package
+        try:
+            spec.loader.exec_module(package)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    return package
+
+
+if __name__ == '<run_path>':
+    load_package(os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,225 @@
+# Helpers to read and write point files as plain or compressed text streams.
+# Compression and decompression run in a background thread that exchanges
+# fixed size chunks through a bounded queue, so the CPU bound (de)compression
+# overlaps with the coordinate processing done by the commands and memory use
+# does not grow with the file size.
+#
+# This module must not import adsk, it is also used outside of Fusion.
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+
+__all__ = [
+    'COMPRESSION_TYPES',
+    'COMPRESSION_EXTENSIONS',
+    'compression_from_path',
+    'detect_compression',
+    'open_points_writer',
+    'open_points_reader',
+]
+
+# Supported compression types, in the order they are shown in dialogs.
+COMPRESSION_TYPES = ['gzip', 'xz', 'bz2']
+
+# File extension appended to the output file name for each compression type.
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'xz': '.xz',
+    'bz2': '.bz2',
+}
+
+_OPENERS = {
+    'gzip': gzip.open,
+    'xz': lzma.open,
+    'bz2': bz2.open,
+}
+
+_MAGIC_NUMBERS = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'BZh', 'bz2'),
+]
+
+# Size of the chunks handed to the background thread and number of chunks
+# that may be in flight. Peak memory is roughly CHUNK_SIZE * (QUEUE_SIZE + 2).
+CHUNK_SIZE = 1 << 20
+QUEUE_SIZE = 8
+
+
+def compression_from_path(path: str):
+    """Returns the compression type implied by the file extension, or None.
+
+    Arguments:
+    path -- The file path to inspect.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    for compression, compression_extension in COMPRESSION_EXTENSIONS.items():
+        if extension == compression_extension:
+            return compression
+    return None
+
+
+def detect_compression(path: str):
+    """Returns the compression type of an existing file, or None for plain text.
+
+    The magic number at the start of the file is checked first, the file
+    extension is used as a fallback.
+
+    Arguments:
+    path -- The file path to inspect.
+    """
+    with open(path, 'rb') as file:
+        head = file.read(6)
+    for magic, compression in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return compression_from_path(path)
+
+
+def open_points_writer(path: str, compression: str = None):
+    """Opens a text stream to write a point file, compressed or not.
+
+    The returned stream can be passed directly to csv.writer and must be closed
+    (or used as a context manager) so the background thread is finished and any
+    compression error is raised.
+
+    Arguments:
+    path -- The output file path.
+    compression -- One of COMPRESSION_TYPES or None to write plain text.
+    """
+    if compression is None:
+        return open(path, 'w', newline='')
+    if compression not in _OPENERS:
+        raise ValueError(f'Unsupported compression type: {compression}')
+    raw = _ThreadedCompressor(path, _OPENERS[compression])
+    return io.TextIOWrapper(io.BufferedWriter(raw, CHUNK_SIZE), newline='')
+
+
+def open_points_reader(path: str, binary: bool = False):
+    """Opens a text stream to read a point file, decompressing it if needed.
+
+    The compression type is detected from the file content and extension.
+
+    Arguments:
+    path -- The input file path.
+    binary -- Opens a binary stream instead, positions in it are byte offsets of the
+              decompressed content. Only uncompressed files are seekable.
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'rb') if binary else open(path, newline='')
+    raw = _ThreadedDecompressor(path, _OPENERS[compression])
+    if binary:
+        return io.BufferedReader(raw, CHUNK_SIZE)
+    return io.TextIOWrapper(io.BufferedReader(raw, CHUNK_SIZE), newline='')
+
+
+class _ThreadedCompressor(io.RawIOBase):
+    """Raw binary stream that compresses the written chunks in a worker thread."""
+
+    def __init__(self, path: str, opener):
+        super().__init__()
+        self.name = path
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(opener,), daemon=True)
+        self._thread.start()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._raise_error()
+        chunk = bytes(data)
+        if chunk:
+            self._queue.put(chunk)
+        return len(chunk)
+
+    def close(self):
+        if not self.closed:
+            self._queue.put(None)
+            self._thread.join()
+            super().close()
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self, opener):
+        try:
+            with opener(self.name, 'wb') as file:
+                while True:
+                    chunk = self._queue.get()
+                    if chunk is None:
+                        return
+                    file.write(chunk)
+        except BaseException as error:
+            self._error = error
+            # Keep consuming so the writing thread never blocks on a full queue.
+            while self._queue.get() is not None:
+                pass
+
+
+class _ThreadedDecompressor(io.RawIOBase):
+    """Raw binary stream fed with chunks decompressed in a worker thread."""
+
+    def __init__(self, path: str, opener):
+        super().__init__()
+        self.name = path
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(opener,), daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            if self._eof:
+                return 0
+            chunk = self._queue.get()
+            if isinstance(chunk, BaseException):
+                self._eof = True
+                raise chunk
+            if chunk is None:
+                self._eof = True
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            # Unblock the worker if it is waiting on a full queue.
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+            self._pending = memoryview(b'')
+            super().close()
+
+    def _run(self, opener):
+        try:
+            with opener(self.name, 'rb') as file:
+                while not self._stop.is_set():
+                    chunk = file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self._queue.put(chunk)
+            self._queue.put(None)
+        except BaseException as error:
+            self._queue.put(error)
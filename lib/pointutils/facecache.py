@@ -0,0 +1,249 @@
+# Export manifest with per-face geometry fingerprints and cached tessellations.
+#
+# Faces are identified by the fingerprint of their geometry rather than by an
+# entity token, so a face whose shape did not change since the last export is
+# found again even if the body was recomputed, and its cached tessellation is
+# reused instead of calling the mesh calculator again.
+#
+# Files written next to the export:
+#   <name>.manifest.json   settings and, per fingerprint, the cache offsets
+#   <name>.facecache       generation, then concatenated coordinate, index and normal arrays
+#
+# Each save writes a new random generation to both files, the cache first and
+# the manifest last. A manifest whose generation differs from the cache, left
+# by a crash between the two writes, is discarded.
+#
+# This module must not import adsk, it is also used outside of Fusion.
+
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+
+__all__ = [
+    'MANIFEST_EXTENSION',
+    'FACE_CACHE_EXTENSION',
+    'FaceMesh',
+    'FaceNodeFilter',
+    'ExportManifest',
+    'fingerprint',
+    'merge_face_meshes',
+]
+
+MANIFEST_EXTENSION = '.manifest.json'
+FACE_CACHE_EXTENSION = '.facecache'
+MANIFEST_VERSION = 2
+GENERATION_SIZE = 16
+
+# Number of significant digits kept when fingerprinting floating point values,
+# so round-off noise of a recompute does not invalidate the cache.
+FINGERPRINT_DIGITS = 10
+
+
+class FaceMesh:
+    """Tessellation of a single face, coordinates are in centimeters."""
+
+    def __init__(self, coordinates, indices, normals):
+        self.coordinates = array('d', coordinates)
+        self.indices = array('i', indices)
+        self.normals = array('d', normals)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.coordinates) // 3
+
+
+def fingerprint(values) -> str:
+    """Returns a stable hash of a sequence of numbers and strings.
+
+    Arguments:
+    values -- The values describing the face geometry and the export settings.
+    """
+    digest = hashlib.sha1()
+    for value in values:
+        if isinstance(value, float):
+            value = f'{value:.{FINGERPRINT_DIGITS}g}'
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def merge_face_meshes(meshes):
+    """Merges face tessellations into a single mesh.
+
+    Nodes with identical coordinates, such as the nodes along edges shared by
+    two faces, are merged into a single node.
+
+    Arguments:
+    meshes -- An iterable of FaceMesh objects.
+
+    :returns:
+        A FaceMesh with the merged coordinates, indices and normals.
+    """
+    merged = FaceMesh([], [], [])
+    nodes = {}
+    for mesh in meshes:
+        node_map = []
+        coordinates = mesh.coordinates
+        for i in range(0, len(coordinates), 3):
+            key = (coordinates[i], coordinates[i + 1], coordinates[i + 2])
+            index = nodes.get(key)
+            if index is None:
+                index = nodes[key] = len(nodes)
+                merged.coordinates.extend(key)
+                merged.normals.extend(mesh.normals[i:i + 3])
+            node_map.append(index)
+        merged.indices.extend(node_map[i] for i in mesh.indices)
+    return merged
+
+
+class FaceNodeFilter:
+    """Drops the nodes of streamed face tessellations already seen in a previous face.
+
+    The nodes kept, in order, are the ones merge_face_meshes keeps. Only nodes on the
+    boundary of a face tessellation can be shared with another face, so only those
+    are remembered and memory grows with the face boundaries rather than the mesh.
+    """
+
+    # Approximate memory used per remembered node, the packed key and its set slot.
+    NODE_SIZE = 100
+
+    def __init__(self):
+        self._boundary_nodes = set()
+
+    @property
+    def memory_size(self) -> int:
+        """Approximate memory used by the remembered boundary nodes, in bytes."""
+        return len(self._boundary_nodes) * self.NODE_SIZE
+
+    def add(self, mesh: FaceMesh) -> array:
+        """Returns the coordinates of the nodes of a face not seen in the previous faces.
+
+        Arguments:
+        mesh -- The face tessellation.
+        """
+        boundary = _boundary_node_flags(mesh)
+        seen = self._boundary_nodes
+        coordinates = mesh.coordinates
+        kept = array('d')
+        for node, is_boundary in enumerate(boundary):
+            point = coordinates[3 * node:3 * node + 3]
+            if is_boundary:
+                # Adding 0.0 turns -0.0 into 0.0, the two compare equal in merge_face_meshes.
+                key = struct.pack('3d', point[0] + 0.0, point[1] + 0.0, point[2] + 0.0)
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.extend(point)
+        return kept
+
+
+class ExportManifest:
+    """Fingerprints and cached tessellations of the faces of a previous export."""
+
+    def __init__(self, base_path: str, settings: dict):
+        """
+        Arguments:
+        base_path -- The export path without extension, the manifest and cache files
+                     are stored next to it.
+        settings -- Export settings, a cache written with other settings is discarded.
+        """
+        self.manifest_path = base_path + MANIFEST_EXTENSION
+        self.cache_path = base_path + FACE_CACHE_EXTENSION
+        self.settings = settings
+        self._faces = {}
+        self._load()
+
+    def __contains__(self, face_fingerprint: str) -> bool:
+        return face_fingerprint in self._faces
+
+    def get(self, face_fingerprint: str) -> FaceMesh:
+        """Reads the cached tessellation of a face, or returns None if it is not cached.
+
+        Arguments:
+        face_fingerprint -- The fingerprint of the face geometry.
+        """
+        entry = self._faces.get(face_fingerprint)
+        if entry is None:
+            return None
+        with open(self.cache_path, 'rb') as file:
+            file.seek(entry['offset'])
+            coordinates = _read_array(file, 'd', entry['coordinates'])
+            indices = _read_array(file, 'i', entry['indices'])
+            normals = _read_array(file, 'd', entry['normals'])
+        return FaceMesh(coordinates, indices, normals)
+
+    def save(self, face_meshes: dict):
+        """Replaces the manifest and cache with the given face tessellations.
+
+        Arguments:
+        face_meshes -- A dictionary of FaceMesh objects keyed by face fingerprint.
+        """
+        faces = {}
+        generation = os.urandom(GENERATION_SIZE)
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(generation)
+            for face_fingerprint, mesh in face_meshes.items():
+                faces[face_fingerprint] = {
+                    'offset': file.tell(),
+                    'coordinates': len(mesh.coordinates),
+                    'indices': len(mesh.indices),
+                    'normals': len(mesh.normals),
+                }
+                for values in (mesh.coordinates, mesh.indices, mesh.normals):
+                    _write_array(file, values)
+        os.replace(temp_path, self.cache_path)
+        manifest = {'version': MANIFEST_VERSION, 'settings': self.settings, 'generation': generation.hex(),
+                    'faces': faces}
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(temp_path, self.manifest_path)
+        self._faces = faces
+
+    def _load(self):
+        if not (os.path.isfile(self.manifest_path) and os.path.isfile(self.cache_path)):
+            return
+        try:
+            with open(self.manifest_path) as file:
+                manifest = json.load(file)
+        except ValueError:
+            return
+        with open(self.cache_path, 'rb') as file:
+            generation = file.read(GENERATION_SIZE).hex()
+        if (manifest.get('version') == MANIFEST_VERSION and manifest.get('settings') == self.settings and
+                manifest.get('generation') == generation):
+            self._faces = manifest['faces']
+
+
+def _boundary_node_flags(mesh: FaceMesh) -> bytearray:
+    # Flags the nodes of the triangle edges that belong to a single triangle.
+    edges = {}
+    indices = mesh.indices
+    for i in range(0, len(indices), 3):
+        a, b, c = indices[i], indices[i + 1], indices[i + 2]
+        for edge in ((a, b) if a < b else (b, a), (b, c) if b < c else (c, b), (a, c) if a < c else (c, a)):
+            edges[edge] = edges.get(edge, 0) + 1
+    flags = bytearray(mesh.node_count)
+    for (a, b), count in edges.items():
+        if count == 1:
+            flags[a] = flags[b] = 1
+    return flags
+
+
+def _read_array(file, typecode: str, count: int) -> array:
+    values = array(typecode)
+    values.fromfile(file, count)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _write_array(file, values: array):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(file)
@@ -0,0 +1,108 @@
+# Reduction of ordered point sequences to the few points a fitted spline is
+# passed through, and measurement of how far the points are from the result.
+#
+# The points are simplified with the Ramer-Douglas-Peucker algorithm: the
+# points kept are the ones the polyline through them needs to stay within the
+# tolerance of every dropped point. A spline fitted through the kept points
+# follows the same shape with orders of magnitude fewer sketch entities.
+#
+# This module must not import adsk, it is also used outside of Fusion.
+
+import math
+from array import array
+
+__all__ = [
+    'simplify_polyline',
+    'max_deviation',
+]
+
+# Number of segments searched past the closest one found so far when measuring
+# the deviation, so a local minimum of an ordered curve does not stop the search.
+DEVIATION_LOOKAHEAD = 8
+
+
+def simplify_polyline(points, tolerance: float) -> list:
+    """Returns the indices of the points kept by the Ramer-Douglas-Peucker simplification.
+
+    The first and last points are always kept and repeated consecutive points are dropped.
+
+    Arguments:
+    points -- Ordered flat sequence of x, y, z values.
+    tolerance -- Maximum distance of a dropped point to the polyline through the kept points.
+    """
+    count = len(points) // 3
+    if count < 3:
+        return list(range(count))
+    keep = bytearray(count)
+    keep[0] = keep[count - 1] = 1
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest = None
+        farthest_distance = tolerance
+        for i in range(first + 1, last):
+            distance = _segment_distance(points, i, first, last)
+            if distance > farthest_distance:
+                farthest = i
+                farthest_distance = distance
+        if farthest is not None:
+            keep[farthest] = 1
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    kept = []
+    for i in range(count):
+        if keep[i] and not (kept and points[3 * i:3 * i + 3] == points[3 * kept[-1]:3 * kept[-1] + 3]):
+            kept.append(i)
+    return kept
+
+
+def max_deviation(points, polyline) -> float:
+    """Returns the largest distance from the points to a polyline following them.
+
+    Both sequences are ordered along the same curve, which keeps the search for the
+    closest polyline segment of each point local.
+
+    Arguments:
+    points -- Ordered flat sequence of x, y, z values.
+    polyline -- Ordered flat sequence of x, y, z values of the polyline vertices.
+    """
+    vertices = array('d', polyline)
+    segment_count = len(vertices) // 3 - 1
+    if segment_count < 1:
+        return 0.0 if segment_count < 0 else max(
+            _distance(points, i, vertices, 0) for i in range(len(points) // 3))
+
+    deviation = 0.0
+    closest = 0
+    for i in range(len(points) // 3):
+        point = array('d', points[3 * i:3 * i + 3])
+        best = _segment_distance(point + vertices[3 * closest:3 * closest + 6], 0, 1, 2)
+        segment = closest + 1
+        last = min(segment_count, closest + 1 + DEVIATION_LOOKAHEAD)
+        while segment < last:
+            distance = _segment_distance(point + vertices[3 * segment:3 * segment + 6], 0, 1, 2)
+            if distance < best:
+                best = distance
+                closest = segment
+                last = min(segment_count, segment + 1 + DEVIATION_LOOKAHEAD)
+            segment += 1
+        deviation = max(deviation, best)
+    return deviation
+
+
+def _distance(points, i: int, other, j: int) -> float:
+    return math.dist(points[3 * i:3 * i + 3], other[3 * j:3 * j + 3])
+
+
+def _segment_distance(points, i: int, first: int, last: int) -> float:
+    # Distance of point i to the segment between the points first and last.
+    px, py, pz = points[3 * i], points[3 * i + 1], points[3 * i + 2]
+    ax, ay, az = points[3 * first], points[3 * first + 1], points[3 * first + 2]
+    dx, dy, dz = points[3 * last] - ax, points[3 * last + 1] - ay, points[3 * last + 2] - az
+    length_squared = dx * dx + dy * dy + dz * dz
+    t = 0.0
+    if length_squared > 0:
+        t = ((px - ax) * dx + (py - ay) * dy + (pz - az) * dz) / length_squared
+        t = min(1.0, max(0.0, t))
+    return math.dist((px, py, pz), (ax + t * dx, ay + t * dy, az + t * dz))
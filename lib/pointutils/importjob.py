@@ -0,0 +1,247 @@
+# Resumable import jobs: chunked reading of point files with byte offsets,
+# checkpoints of the committed chunks and quarantine of malformed rows.
+#
+# Files written for an imported point file:
+#   <name>.import.json      offset and line of the last committed chunk, the
+#                           points and sketches created so far and the job options
+#   <name>.quarantine.csv   line number and content of each malformed row
+#
+# They are written next to the point file, or in a jobs folder when one is given,
+# such as a per-user folder for point files on read-only shares. Files in a jobs
+# folder are prefixed with a hash of the point file path, keeping them unique.
+#
+# A checkpoint only resumes the job it was written for: it is discarded when
+# the point file changed or the job options differ.
+#
+# This module must not import adsk, it is also used outside of Fusion.
+
+import csv
+import hashlib
+import json
+import math
+import os
+from array import array
+
+from .compression import CHUNK_SIZE, open_points_reader
+from .lod import is_lod_file, read_lod
+
+__all__ = [
+    'CHECKPOINT_EXTENSION',
+    'QUARANTINE_EXTENSION',
+    'ImportCheckpoint',
+    'QuarantineFile',
+    'iter_point_chunks',
+    'job_file_path',
+]
+
+CHECKPOINT_EXTENSION = '.import.json'
+QUARANTINE_EXTENSION = '.quarantine.csv'
+CHECKPOINT_VERSION = 1
+
+
+class ImportCheckpoint:
+    """Progress of an import job, saved after each committed chunk."""
+
+    def __init__(self, path: str, options: dict, folder: str = None):
+        """
+        Arguments:
+        path -- The point file path.
+        options -- Job options, a checkpoint written with other options is not resumed.
+        folder -- Optional jobs folder the checkpoint is written to, instead of next to the point file.
+        """
+        self.path = path
+        self.checkpoint_path = job_file_path(path, CHECKPOINT_EXTENSION, folder)
+        self.options = options
+        self.offset = 0
+        self.line = 0
+        self.points = 0
+        self.sketches = []
+        self.quarantine_size = 0
+
+    def load(self) -> bool:
+        """Loads the saved progress, returns False if there is no checkpoint of this job.
+
+        A checkpoint of another job, or of an earlier version of the point file, is ignored.
+        """
+        if not os.path.isfile(self.checkpoint_path):
+            return False
+        try:
+            with open(self.checkpoint_path) as file:
+                checkpoint = json.load(file)
+        except ValueError:
+            return False
+        if (checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('options') != self.options or
+                checkpoint.get('signature') != self._signature()):
+            return False
+        self.offset = checkpoint['offset']
+        self.line = checkpoint['line']
+        self.points = checkpoint['points']
+        self.sketches = checkpoint['sketches']
+        self.quarantine_size = checkpoint['quarantine_size']
+        return True
+
+    def save(self):
+        """Writes the progress, replacing the previous checkpoint atomically."""
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'signature': self._signature(),
+            'options': self.options,
+            'offset': self.offset,
+            'line': self.line,
+            'points': self.points,
+            'sketches': self.sketches,
+            'quarantine_size': self.quarantine_size,
+        }
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def remove(self):
+        """Deletes the checkpoint, once the job is complete or restarted."""
+        if os.path.isfile(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _signature(self) -> list:
+        status = os.stat(self.path)
+        return [status.st_size, status.st_mtime_ns]
+
+
+class QuarantineFile:
+    """Side file collecting the malformed rows of a point file, opened on the first row."""
+
+    def __init__(self, path: str, size: int = 0, folder: str = None):
+        """
+        Arguments:
+        path -- The point file path.
+        size -- Size of the quarantine file at the resumed checkpoint, the rows
+                written after it are discarded so they are not quarantined twice.
+        folder -- Optional jobs folder the quarantine file is written to, instead of next to the point file.
+        """
+        self.quarantine_path = job_file_path(path, QUARANTINE_EXTENSION, folder)
+        self.count = 0
+        self._size = size
+        self._file = None
+        self._writer = None
+
+    @property
+    def size(self) -> int:
+        """Size of the quarantine file in bytes, including the buffered rows."""
+        if self._file is None:
+            return self._size
+        self._file.flush()
+        return self._file.tell()
+
+    def add(self, line: int, row: str):
+        """Quarantines a malformed row.
+
+        Arguments:
+        line -- The line number of the row in the point file, starting at 1.
+        row -- The row text.
+        """
+        if self._file is None:
+            self._open()
+        self._writer.writerow([line, row])
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        exists = self._size > 0 and os.path.isfile(self.quarantine_path)
+        self._file = open(self.quarantine_path, 'r+' if exists else 'w', newline='')
+        if exists:
+            self._file.truncate(self._size)
+            self._file.seek(self._size)
+        self._writer = csv.writer(self._file)
+        if not exists:
+            self._writer.writerow(['line', 'row'])
+
+
+def job_file_path(path: str, extension: str, folder: str = None) -> str:
+    """Returns the path of a job file of a point file, creating the jobs folder if needed.
+
+    Arguments:
+    path -- The point file path.
+    extension -- The job file extension, such as CHECKPOINT_EXTENSION.
+    folder -- Optional jobs folder, the job file is next to the point file otherwise.
+    """
+    if folder is None:
+        return path + extension
+    os.makedirs(folder, exist_ok=True)
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(path)).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(folder, f'{key}-{os.path.basename(path)}{extension}')
+
+
+def iter_point_chunks(path: str, chunk_points: int, offset: int = 0, line: int = 0, quarantine=None,
+                      lod_level: int = None, region=None, typecode: str = 'd'):
+    """Reads a point file in chunks, yielding (points, offset, line) after each chunk.
+
+    offset and line locate the end of the chunk, passing them back resumes the reading
+    after it. For CSV files offset is a byte offset, in the decompressed content for
+    compressed files. LOD containers are read at once and offset and line count points.
+    Empty rows are skipped and malformed rows are quarantined.
+
+    Arguments:
+    path -- The point file path.
+    chunk_points -- Number of points of each chunk, the last chunk may be shorter.
+    offset -- Offset to start reading from.
+    line -- Number of lines before offset.
+    quarantine -- Optional QuarantineFile receiving the malformed rows, they are skipped otherwise.
+    lod_level -- Highest level loaded from a LOD container, None loads every level.
+    region -- Optional bounding box loaded from a LOD container.
+    typecode -- The array type code, 'd' for float64 or 'f' for float32.
+    """
+    if is_lod_file(path):
+        points = read_lod(path, lod_level, region)
+        count = len(points) // 3
+        for start in range(offset, count, chunk_points):
+            end = min(start + chunk_points, count)
+            yield array(typecode, points[3 * start:3 * end]), end, end
+        return
+
+    with open_points_reader(path, binary=True) as file:
+        _skip(file, offset)
+        points = array(typecode)
+        for raw in file:
+            line += 1
+            offset += len(raw)
+            values = _parse_row(raw)
+            if values is None:
+                if raw.strip() and quarantine is not None:
+                    quarantine.add(line, raw.decode('utf-8', 'replace').rstrip('\r\n'))
+                continue
+            points.extend(values)
+            if len(points) >= 3 * chunk_points:
+                yield points, offset, line
+                points = array(typecode)
+        if points:
+            yield points, offset, line
+
+
+def _skip(file, offset: int):
+    if file.seekable():
+        file.seek(offset)
+        return
+    while offset > 0:
+        skipped = len(file.read(min(offset, CHUNK_SIZE)))
+        if not skipped:
+            break
+        offset -= skipped
+
+
+def _parse_row(raw: bytes):
+    # Returns the x, y, z values of a row, or None when it is empty or malformed.
+    fields = raw.split(b',')
+    if len(fields) < 3:
+        return None
+    try:
+        values = (float(fields[0].strip(b' "')), float(fields[1].strip(b' "')),
+                  float(fields[2].strip(b' "\r\n')))
+    except ValueError:
+        return None
+    if not all(math.isfinite(value) for value in values):
+        return None
+    return values
@@ -0,0 +1,237 @@
+# Multi-resolution level of detail (LOD) point container.
+#
+# A single point set is decimated hierarchically on nested grids: level 0 keeps
+# one point per coarse cell, every following level adds the points that refine
+# the grid by a factor of two, and the last level holds all remaining points.
+# Loading levels 0..n therefore gives a progressively denser point set.
+#
+# File layout:
+#   8 bytes   magic number, LOD_MAGIC
+#   8 bytes   header length, unsigned little-endian integer
+#   n bytes   header, UTF-8 JSON with the level and tile index
+#   data      blocks of little-endian float64 x, y, z triplets
+#
+# Each header tile entry holds the byte offset (relative to the start of the
+# data section), the point count and the bounding box of the points of its
+# block, so readers can seek straight to the level and region they need.
+#
+# This module must not import adsk, it is also used outside of Fusion.
+
+import json
+import math
+import struct
+import sys
+from array import array
+
+__all__ = [
+    'LOD_EXTENSION',
+    'is_lod_file',
+    'write_lod',
+    'read_lod_header',
+    'read_lod',
+]
+
+LOD_MAGIC = b'STPLOD01'
+LOD_EXTENSION = '.stplod'
+LOD_VERSION = 1
+
+_LENGTH = struct.Struct('<Q')
+_POINT_SIZE = 3 * 8
+
+
+def is_lod_file(path: str) -> bool:
+    """Returns True if the file at path is a LOD container.
+
+    Arguments:
+    path -- The file path to inspect.
+    """
+    with open(path, 'rb') as file:
+        return file.read(len(LOD_MAGIC)) == LOD_MAGIC
+
+
+def write_lod(path: str, coordinates, levels: int = 4, tiles_per_axis: int = 4) -> dict:
+    """Writes a point set as a LOD container and returns its header.
+
+    Arguments:
+    path -- The output file path.
+    coordinates -- Flat sequence of x, y, z values.
+    levels -- Number of levels of detail, the last one holds every point.
+    tiles_per_axis -- Number of spatial tiles along each axis of the bounding box.
+    """
+    if levels < 1 or tiles_per_axis < 1:
+        raise ValueError('levels and tiles_per_axis must be at least 1')
+    count = len(coordinates) // 3
+    bbox = _bounding_box(coordinates, count)
+    point_levels = _decimate(coordinates, count, bbox, levels, tiles_per_axis)
+
+    # Group point indices by level and tile
+    blocks = [{} for _ in range(levels)]
+    for i in range(count):
+        tile = _cell(coordinates, i, bbox, tiles_per_axis)
+        blocks[point_levels[i]].setdefault(tile, []).append(i)
+
+    header = {
+        'version': LOD_VERSION,
+        'count': count,
+        'bbox': bbox,
+        'tiles_per_axis': tiles_per_axis,
+        'levels': [],
+    }
+    offset = 0
+    for level, tiles in enumerate(blocks):
+        level_info = {'level': level, 'count': 0, 'tiles': []}
+        for tile in sorted(tiles):
+            tile_count = len(tiles[tile])
+            level_info['tiles'].append({
+                'tile': list(tile),
+                'bbox': _tile_box(coordinates, tiles[tile]),
+                'offset': offset,
+                'count': tile_count,
+            })
+            level_info['count'] += tile_count
+            offset += tile_count * _POINT_SIZE
+        header['levels'].append(level_info)
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    with open(path, 'wb') as file:
+        file.write(LOD_MAGIC)
+        file.write(_LENGTH.pack(len(header_bytes)))
+        file.write(header_bytes)
+        for tiles in blocks:
+            for tile in sorted(tiles):
+                block = array('d')
+                for i in tiles[tile]:
+                    block.extend(coordinates[3 * i:3 * i + 3])
+                if sys.byteorder == 'big':
+                    block.byteswap()
+                block.tofile(file)
+    return header
+
+
+def read_lod_header(path: str) -> dict:
+    """Reads the header index of a LOD container.
+
+    The returned dictionary has an extra 'data_offset' key with the absolute
+    position of the data section in the file.
+
+    Arguments:
+    path -- The LOD container path.
+    """
+    with open(path, 'rb') as file:
+        return _read_header(file)
+
+
+def read_lod(path: str, level: int = None, bbox=None) -> array:
+    """Reads the points of a LOD container up to a level and inside a region.
+
+    Only the blocks of the requested levels whose tiles intersect the region
+    are read from disk.
+
+    Arguments:
+    path -- The LOD container path.
+    level -- Highest level to load, None or a negative value loads the finest level.
+    bbox -- Optional [min_x, min_y, min_z, max_x, max_y, max_z] region to load.
+
+    :returns:
+        A flat array of x, y, z values.
+    """
+    points = array('d')
+    with open(path, 'rb') as file:
+        header = _read_header(file)
+        levels = header['levels']
+        if level is None or level < 0 or level >= len(levels):
+            level = len(levels) - 1
+        for level_info in levels[:level + 1]:
+            for tile in level_info['tiles']:
+                if bbox is not None and not _boxes_intersect(tile['bbox'], bbox):
+                    continue
+                file.seek(header['data_offset'] + tile['offset'])
+                block = array('d')
+                block.fromfile(file, 3 * tile['count'])
+                if sys.byteorder == 'big':
+                    block.byteswap()
+                if bbox is not None and not _box_contains(bbox, tile['bbox']):
+                    block = _filter_box(block, bbox)
+                points.extend(block)
+    return points
+
+
+def _read_header(file) -> dict:
+    if file.read(len(LOD_MAGIC)) != LOD_MAGIC:
+        raise ValueError(f'{file.name} is not a LOD container')
+    (length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+    header = json.loads(file.read(length).decode('utf-8'))
+    if header.get('version') != LOD_VERSION:
+        raise ValueError(f'Unsupported LOD container version: {header.get("version")}')
+    header['data_offset'] = len(LOD_MAGIC) + _LENGTH.size + length
+    return header
+
+
+def _bounding_box(coordinates, count: int) -> list:
+    if count == 0:
+        return [0.0] * 6
+    xs = coordinates[0:3 * count:3]
+    ys = coordinates[1:3 * count:3]
+    zs = coordinates[2:3 * count:3]
+    return [min(xs), min(ys), min(zs), max(xs), max(ys), max(zs)]
+
+
+def _cell(coordinates, i: int, bbox: list, cells_per_axis: int) -> tuple:
+    cell = []
+    for axis in range(3):
+        extent = bbox[axis + 3] - bbox[axis]
+        if extent <= 0:
+            cell.append(0)
+            continue
+        index = int((coordinates[3 * i + axis] - bbox[axis]) / extent * cells_per_axis)
+        cell.append(min(index, cells_per_axis - 1))
+    return tuple(cell)
+
+
+def _tile_box(coordinates, indices: list) -> list:
+    # Bounding box of the points of a tile. It is computed from the points rather than
+    # from the grid, whose rounding could leave a point of the tile just outside of it.
+    box = [math.inf] * 3 + [-math.inf] * 3
+    for i in indices:
+        for axis in range(3):
+            value = coordinates[3 * i + axis]
+            if value < box[axis]:
+                box[axis] = value
+            if value > box[axis + 3]:
+                box[axis + 3] = value
+    return box
+
+
+def _decimate(coordinates, count: int, bbox: list, levels: int, tiles_per_axis: int) -> bytearray:
+    # Assigns every point to the first level whose grid cell it is the first to occupy.
+    last_level = levels - 1
+    point_levels = bytearray([last_level]) * count
+    selected = []
+    for level in range(last_level):
+        cells_per_axis = tiles_per_axis * 2 ** (level + 1)
+        occupied = {_cell(coordinates, i, bbox, cells_per_axis) for i in selected}
+        for i in range(count):
+            if point_levels[i] != last_level:
+                continue
+            cell = _cell(coordinates, i, bbox, cells_per_axis)
+            if cell not in occupied:
+                occupied.add(cell)
+                point_levels[i] = level
+                selected.append(i)
+    return point_levels
+
+
+def _boxes_intersect(a, b) -> bool:
+    return all(a[axis] <= b[axis + 3] and b[axis] <= a[axis + 3] for axis in range(3))
+
+
+def _box_contains(outer, inner) -> bool:
+    return all(outer[axis] <= inner[axis] and inner[axis + 3] <= outer[axis + 3] for axis in range(3))
+
+
+def _filter_box(block: array, bbox) -> array:
+    filtered = array('d')
+    for i in range(0, len(block), 3):
+        if all(bbox[axis] <= block[i + axis] <= bbox[axis + 3] for axis in range(3)):
+            filtered.extend(block[i:i + 3])
+    return filtered
@@ -0,0 +1,139 @@
+# Parallel parsing of many point files.
+#
+# Files are parsed in worker processes, outside of the Fusion process, and the
+# results are handed back in the order of the input paths. At most max_pending
+# files are parsed ahead of the consumer, so parsing overlaps with the geometry
+# creation done on the main thread while memory stays bounded.
+#
+# Fusion embeds Python, so sys.executable is usually the Fusion executable. The
+# interpreter shipped with Fusion is located and used to spawn the workers; if
+# none is found, or the process pool cannot start, threads are used instead.
+#
+# This module must not import adsk, it is also imported by the worker processes.
+
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import runpy
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+from . import _bootstrap
+from .lod import is_lod_file, read_lod
+from .pointfile import read_points
+
+__all__ = [
+    'POINT_FILE_EXTENSIONS',
+    'list_point_files',
+    'parse_point_file',
+    'iter_point_files',
+]
+
+# Extensions of the files picked up when importing a folder.
+POINT_FILE_EXTENSIONS = ('.csv', '.csv.gz', '.csv.xz', '.csv.bz2', '.stplod')
+
+_PACKAGE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def list_point_files(folder: str) -> list:
+    """Returns the point files of a folder, sorted by name.
+
+    Arguments:
+    folder -- The folder to scan, sub folders are ignored.
+    """
+    paths = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path) and name.lower().endswith(POINT_FILE_EXTENSIONS):
+            paths.append(path)
+    return sorted(paths)
+
+
+def parse_point_file(path: str, lod_level: int = None, region=None):
+    """Reads the points of a file into a flat float64 array.
+
+    Arguments:
+    path -- The point file path, plain or compressed CSV or LOD container.
+    lod_level -- Highest level loaded from a LOD container, None loads every level.
+    region -- Optional bounding box loaded from a LOD container.
+    """
+    if is_lod_file(path):
+        return read_lod(path, lod_level, region)
+    return read_points(path)
+
+
+def iter_point_files(paths, max_workers: int = None, max_pending: int = None, **kwargs):
+    """Parses point files concurrently and yields (path, points) in the order of paths.
+
+    Arguments:
+    paths -- The point file paths.
+    max_workers -- Number of worker processes, defaults to the number of CPUs.
+    max_pending -- Maximum number of files parsed ahead of the consumer, defaults to
+                   twice the number of workers.
+    kwargs -- Extra keyword arguments passed to parse_point_file.
+    """
+    paths = list(paths)
+    if len(paths) == 1:
+        # Nothing to overlap with, skip the cost of starting workers
+        yield paths[0], parse_point_file(paths[0], **kwargs)
+        return
+    max_workers = max_workers or min(len(paths), os.cpu_count() or 1) or 1
+    max_pending = max_pending or 2 * max_workers
+    executor, parse = _create_executor(max_workers)
+    pending = collections.deque()
+    next_index = 0
+    try:
+        while next_index < len(paths) or pending:
+            # Keep the workers busy while the consumer processes the previous result
+            while next_index < len(paths) and len(pending) < max_pending:
+                pending.append((next_index, executor.submit(parse, paths[next_index], **kwargs)))
+                next_index += 1
+            index, future = pending.popleft()
+            try:
+                points = future.result()
+            except BrokenProcessPool:
+                # The worker processes could not run, parse the remaining files in threads.
+                executor.shutdown(wait=False)
+                executor, parse = concurrent.futures.ThreadPoolExecutor(max_workers), parse_point_file
+                indices = [index] + [i for i, _ in pending]
+                pending = collections.deque((i, executor.submit(parse, paths[i], **kwargs)) for i in indices)
+                continue
+            yield paths[index], points
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def _create_executor(max_workers: int):
+    python = _python_executable()
+    if python is None:
+        return concurrent.futures.ThreadPoolExecutor(max_workers), parse_point_file
+
+    # Workers unpickle the parse function by module name, so it is referenced through
+    # the package loaded under a name unique to this add-in, which each worker loads
+    # the same way before its first task.
+    parse = _bootstrap.load_package(_PACKAGE_FOLDER).parallel.parse_point_file
+
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(python)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers, mp_context=context,
+                                                      initializer=runpy.run_path,
+                                                      initargs=(_bootstrap.__file__,))
+    return executor, parse
+
+
+def _python_executable():
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    candidates = [
+        os.path.join(sys.prefix, 'python.exe'),
+        os.path.join(sys.prefix, 'bin', 'python3'),
+        os.path.join(sys.prefix, 'bin', 'python'),
+        getattr(sys, '_base_executable', ''),
+    ]
+    for candidate in candidates:
+        if candidate and os.path.basename(candidate).lower().startswith('python') and os.path.isfile(candidate):
+            return candidate
+    return None
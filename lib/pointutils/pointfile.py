@@ -0,0 +1,33 @@
+# Reading of point files in any of the formats written by the add-in.
+#
+# This module must not import adsk, it is also used outside of Fusion.
+
+import csv
+from array import array
+
+from .compression import open_points_reader
+from .lod import is_lod_file, read_lod
+
+__all__ = [
+    'read_points',
+]
+
+
+def read_points(path: str, typecode: str = 'd') -> array:
+    """Reads the x, y, z coordinates of a point file into a flat array.
+
+    Plain and compressed CSV files and LOD containers (finest level) are supported.
+
+    Arguments:
+    path -- The point file path.
+    typecode -- The array type code, 'd' for float64 or 'f' for float32.
+    """
+    if is_lod_file(path):
+        return array(typecode, read_lod(path))
+    points = array(typecode)
+    with open_points_reader(path) as file:
+        for row in csv.reader(file, delimiter=','):
+            if not row:
+                continue
+            points.extend((float(row[0]), float(row[1]), float(row[2])))
+    return points
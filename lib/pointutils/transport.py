@@ -0,0 +1,216 @@
+# Chunked, sequence numbered transport of typed arrays between Python and the
+# HTML palette.
+#
+# A stream is made of a 'pointStreamBegin' message, any number of
+# 'pointStreamChunk' messages carrying base64 encoded little-endian typed array
+# bytes, and a 'pointStreamEnd' message. Every chunk is acknowledged with a
+# 'pointStreamAck' message and the sender never has more than WINDOW chunks
+# waiting for an acknowledgement, so neither side builds huge strings or queues
+# and Fusion's UI thread is only busy for one chunk at a time.
+#
+# Python to palette: messages are sent with Palette.sendInfoToHTML and the
+# acknowledgements come back as incomingFromHTML events.
+# Palette to Python: messages arrive as incomingFromHTML events and the
+# acknowledgement is the returnData of the event.
+#
+# This module must not import adsk, it is also used outside of Fusion.
+
+import base64
+import itertools
+import json
+import sys
+from array import array
+
+__all__ = [
+    'STREAM_ACTIONS',
+    'PointStreamSender',
+    'PointStreamReceiver',
+    'send_stream',
+    'handle_stream_message',
+    'pop_received_stream',
+]
+
+BEGIN_ACTION = 'pointStreamBegin'
+CHUNK_ACTION = 'pointStreamChunk'
+END_ACTION = 'pointStreamEnd'
+ACK_ACTION = 'pointStreamAck'
+STREAM_ACTIONS = (BEGIN_ACTION, CHUNK_ACTION, END_ACTION, ACK_ACTION)
+
+# Number of array values per chunk, a multiple of 3 so chunks never split a
+# point, and number of unacknowledged chunks.
+CHUNK_VALUES = 3 << 16
+WINDOW = 4
+
+# Array type codes and the matching javascript typed array names.
+_DTYPES = {'f': 'float32', 'd': 'float64', 'i': 'int32'}
+_TYPECODES = {dtype: typecode for typecode, dtype in _DTYPES.items()}
+
+_stream_ids = itertools.count(1)
+_senders = {}
+_receivers = {}
+_received = {}
+
+
+class PointStreamSender:
+    """Sends an array to the palette in acknowledged chunks."""
+
+    def __init__(self, send, values: array, name: str = '', chunk_values: int = CHUNK_VALUES, window: int = WINDOW):
+        """
+        Arguments:
+        send -- Callable taking an action and a JSON string, typically Palette.sendInfoToHTML.
+        values -- The array to send, its type code must be 'f', 'd' or 'i'.
+        name -- Optional name passed to the palette with the stream.
+        chunk_values -- Number of array values per chunk.
+        window -- Maximum number of chunks waiting for an acknowledgement.
+        """
+        if values.typecode not in _DTYPES:
+            raise ValueError(f'Unsupported array type code: {values.typecode}')
+        self.stream_id = next(_stream_ids)
+        self.name = name
+        self._send = send
+        self._values = values
+        self._chunk_values = chunk_values
+        self._window = window
+        self.chunk_count = (len(values) + chunk_values - 1) // chunk_values
+        self._next_seq = 0
+        self._acknowledged = set()
+        self.done = False
+
+    def start(self):
+        """Sends the stream header and the first window of chunks."""
+        self._send_message(BEGIN_ACTION, {
+            'name': self.name,
+            'dtype': _DTYPES[self._values.typecode],
+            'count': len(self._values),
+            'chunks': self.chunk_count,
+            'chunk_values': self._chunk_values,
+        })
+        self._fill_window()
+
+    def acknowledge(self, seq: int):
+        """Records the acknowledgement of a chunk and sends the next ones.
+
+        Arguments:
+        seq -- The sequence number of the acknowledged chunk.
+        """
+        self._acknowledged.add(seq)
+        self._fill_window()
+
+    def _fill_window(self):
+        while self._next_seq < self.chunk_count and self._next_seq - len(self._acknowledged) < self._window:
+            start = self._next_seq * self._chunk_values
+            chunk = self._values[start:start + self._chunk_values]
+            if sys.byteorder == 'big':
+                chunk.byteswap()
+            self._send_message(CHUNK_ACTION, {
+                'seq': self._next_seq,
+                'data': base64.b64encode(chunk.tobytes()).decode('ascii'),
+            })
+            self._next_seq += 1
+        if not self.done and len(self._acknowledged) == self.chunk_count:
+            self.done = True
+            self._send_message(END_ACTION, {})
+
+    def _send_message(self, action: str, data: dict):
+        data['stream'] = self.stream_id
+        self._send(action, json.dumps(data))
+
+
+class PointStreamReceiver:
+    """Reassembles an array from chunks sent by the palette."""
+
+    def __init__(self, stream_id, name: str, dtype: str, count: int, chunks: int):
+        if dtype not in _TYPECODES:
+            raise ValueError(f'Unsupported stream data type: {dtype}')
+        self.stream_id = stream_id
+        self.name = name
+        self.count = count
+        self.chunk_count = chunks
+        self.values = array(_TYPECODES[dtype])
+        self._next_seq = 0
+        self._pending = {}
+        self.done = False
+
+    def add_chunk(self, seq: int, data: str):
+        """Decodes a chunk and appends it, together with any buffered following chunks.
+
+        Arguments:
+        seq -- The sequence number of the chunk.
+        data -- The base64 encoded little-endian array bytes.
+        """
+        self._pending[seq] = base64.b64decode(data)
+        while self._next_seq in self._pending:
+            chunk = array(self.values.typecode)
+            chunk.frombytes(self._pending.pop(self._next_seq))
+            if sys.byteorder == 'big':
+                chunk.byteswap()
+            self.values.extend(chunk)
+            self._next_seq += 1
+
+    def finish(self):
+        """Marks the stream as complete and checks that nothing was lost."""
+        if self._pending or self._next_seq != self.chunk_count or len(self.values) != self.count:
+            raise ValueError(f'Stream {self.stream_id} ended with {len(self.values)} of {self.count} values')
+        self.done = True
+
+
+def send_stream(send, values: array, name: str = '') -> PointStreamSender:
+    """Starts sending an array to the palette and returns its sender.
+
+    The stream progresses as handle_stream_message receives the acknowledgements.
+
+    Arguments:
+    send -- Callable taking an action and a JSON string, typically Palette.sendInfoToHTML.
+    values -- The array to send, its type code must be 'f', 'd' or 'i'.
+    name -- Optional name passed to the palette with the stream.
+    """
+    sender = PointStreamSender(send, values, name)
+    _senders[sender.stream_id] = sender
+    sender.start()
+    if sender.done:
+        del _senders[sender.stream_id]
+    return sender
+
+
+def handle_stream_message(action: str, data: str) -> str:
+    """Handles a stream message received from the palette.
+
+    Arguments:
+    action -- The message action, one of STREAM_ACTIONS.
+    data -- The JSON message data.
+
+    :returns:
+        The JSON string to return to the palette, acknowledging received chunks.
+    """
+    message = json.loads(data)
+    stream_id = message['stream']
+    if action == ACK_ACTION:
+        sender = _senders.get(stream_id)
+        if sender is not None:
+            sender.acknowledge(message['seq'])
+            if sender.done:
+                del _senders[stream_id]
+        return json.dumps({'stream': stream_id})
+    if action == BEGIN_ACTION:
+        _receivers[stream_id] = PointStreamReceiver(stream_id, message.get('name', ''), message['dtype'],
+                                                    message['count'], message['chunks'])
+        return json.dumps({'stream': stream_id})
+    receiver = _receivers[stream_id]
+    if action == CHUNK_ACTION:
+        receiver.add_chunk(message['seq'], message['data'])
+        return json.dumps({'stream': stream_id, 'seq': message['seq']})
+    if action == END_ACTION:
+        del _receivers[stream_id]
+        receiver.finish()
+        _received[stream_id] = receiver
+        return json.dumps({'stream': stream_id, 'done': True})
+    raise ValueError(f'Unexpected stream action: {action}')
+
+
+def pop_received_stream(stream_id) -> PointStreamReceiver:
+    """Returns and forgets a completely received stream, or None if it is not complete.
+
+    Arguments:
+    stream_id -- The stream id chosen by the palette.
+    """
+    return _received.pop(stream_id, None)
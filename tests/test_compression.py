@@ -0,0 +1,49 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib'))
+
+from pointutils import (COMPRESSION_EXTENSIONS, COMPRESSION_TYPES, compression_from_path,  # noqa: E402
+                        detect_compression, open_points_reader, open_points_writer)
+
+ROWS = [[f'{i * 0.5:.3f}', f'{-i:.3f}', f'{i * i:.3f}'] for i in range(20000)]
+
+
+def _write(path, compression):
+    with open_points_writer(path, compression) as file:
+        csv.writer(file).writerows(ROWS)
+
+
+@pytest.mark.parametrize('compression', COMPRESSION_TYPES)
+def test_round_trip(tmp_path, compression):
+    path = str(tmp_path / ('points.csv' + COMPRESSION_EXTENSIONS[compression]))
+    _write(path, compression)
+    assert compression_from_path(path) == compression
+    assert detect_compression(path) == compression
+    with open_points_reader(path) as file:
+        assert list(csv.reader(file)) == ROWS
+
+
+@pytest.mark.parametrize('compression', COMPRESSION_TYPES)
+def test_detected_from_content(tmp_path, compression):
+    path = str(tmp_path / 'points.csv')
+    _write(path, compression)
+    assert detect_compression(path) == compression
+    with open_points_reader(path, binary=True) as file:
+        assert file.read().decode().splitlines()[-1] == ','.join(ROWS[-1])
+
+
+def test_plain_text(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    _write(path, None)
+    assert detect_compression(path) is None
+    with open_points_reader(path) as file:
+        assert list(csv.reader(file)) == ROWS
+
+
+def test_unsupported_compression(tmp_path):
+    with pytest.raises(ValueError):
+        open_points_writer(str(tmp_path / 'points.csv.zip'), 'zip')
@@ -0,0 +1,67 @@
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib'))
+
+from pointutils import MANIFEST_EXTENSION, ExportManifest, FaceMesh, FaceNodeFilter, merge_face_meshes  # noqa: E402
+
+
+def _grid_face(x, y, n=5):
+    # Unit square face at (x, y) tessellated with n x n nodes, neighbours share their edge nodes.
+    coordinates = []
+    indices = []
+    for j in range(n):
+        for i in range(n):
+            coordinates += [x + i / (n - 1), y + j / (n - 1), 0.0]
+    for j in range(n - 1):
+        for i in range(n - 1):
+            a = j * n + i
+            indices += [a, a + 1, a + n, a + 1, a + n + 1, a + n]
+    return FaceMesh(coordinates, indices, [0.0, 0.0, 1.0] * (n * n))
+
+
+def test_streamed_nodes_match_merged_mesh():
+    meshes = [_grid_face(x, y) for x in range(3) for y in range(2)]
+    node_filter = FaceNodeFilter()
+    streamed = array('d')
+    for mesh in meshes:
+        streamed.extend(node_filter.add(mesh))
+    assert streamed == merge_face_meshes(meshes).coordinates
+
+
+def test_streamed_nodes_differ_from_body_tessellation_order():
+    # Known limitation: a streaming export writes the nodes face by face, like the
+    # incremental export, not in the node order of a whole body tessellation.
+    meshes = [_grid_face(x, 0) for x in range(2)]
+    node_filter = FaceNodeFilter()
+    streamed = array('d')
+    for mesh in meshes:
+        streamed.extend(node_filter.add(mesh))
+    points = [tuple(streamed[i:i + 3]) for i in range(0, len(streamed), 3)]
+    body_order = sorted(points, key=lambda point: (point[1], point[0]))
+    assert points != body_order
+    assert sorted(points) == sorted(body_order)
+
+
+def test_manifest_round_trip(tmp_path):
+    base_path = str(tmp_path / 'export')
+    mesh = _grid_face(0, 0)
+    ExportManifest(base_path, {'mode': 1}).save({'a': mesh})
+    manifest = ExportManifest(base_path, {'mode': 1})
+    assert 'a' in manifest
+    assert manifest.get('a').coordinates == mesh.coordinates
+    assert manifest.get('a').indices == mesh.indices
+    assert 'a' not in ExportManifest(base_path, {'mode': 2})
+
+
+def test_manifest_of_another_cache_is_discarded(tmp_path):
+    # A crash after the cache is replaced leaves the previous manifest behind.
+    base_path = str(tmp_path / 'export')
+    ExportManifest(base_path, {}).save({'a': _grid_face(0, 0)})
+    with open(base_path + MANIFEST_EXTENSION) as file:
+        previous_manifest = file.read()
+    ExportManifest(base_path, {}).save({'b': _grid_face(1, 0)})
+    with open(base_path + MANIFEST_EXTENSION, 'w') as file:
+        file.write(previous_manifest)
+    assert 'a' not in ExportManifest(base_path, {})
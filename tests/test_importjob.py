@@ -0,0 +1,107 @@
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib'))
+
+from pointutils import (ImportCheckpoint, QuarantineFile, iter_point_chunks, job_file_path,  # noqa: E402
+                        open_points_writer, write_lod)
+
+OPTIONS = {'merge': True, 'tolerance': 0.1}
+
+
+def _write_csv(path, rows, compression=None):
+    with open_points_writer(path, compression) as file:
+        file.write(''.join(row + '\n' for row in rows))
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    _write_csv(path, ['1,2,3'])
+    checkpoint = ImportCheckpoint(path, OPTIONS)
+    assert not checkpoint.load()
+    checkpoint.offset, checkpoint.line, checkpoint.points = 6, 1, 1
+    checkpoint.sketches = ['token']
+    checkpoint.quarantine_size = 12
+    checkpoint.save()
+    assert checkpoint.checkpoint_path == path + '.import.json'
+
+    loaded = ImportCheckpoint(path, dict(OPTIONS))
+    assert loaded.load()
+    assert (loaded.offset, loaded.line, loaded.points, loaded.sketches, loaded.quarantine_size) == \
+        (6, 1, 1, ['token'], 12)
+
+    loaded.remove()
+    assert not os.path.exists(checkpoint.checkpoint_path)
+    assert not ImportCheckpoint(path, OPTIONS).load()
+
+
+def test_checkpoint_of_another_job_is_ignored(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    _write_csv(path, ['1,2,3'])
+    ImportCheckpoint(path, OPTIONS).save()
+    assert not ImportCheckpoint(path, dict(OPTIONS, merge=False)).load()
+
+    _write_csv(path, ['1,2,3', '4,5,6'])
+    assert not ImportCheckpoint(path, OPTIONS).load()
+
+
+def test_checkpoint_in_jobs_folder(tmp_path):
+    path = str(tmp_path / 'share' / 'points.csv')
+    os.makedirs(os.path.dirname(path))
+    _write_csv(path, ['1,2,3'])
+    folder = str(tmp_path / 'jobs')
+    checkpoint = ImportCheckpoint(path, OPTIONS, folder)
+    checkpoint.save()
+    assert os.path.dirname(checkpoint.checkpoint_path) == folder
+    assert ImportCheckpoint(path, OPTIONS, folder).load()
+    assert job_file_path(path, '.x', folder) != job_file_path(str(tmp_path / 'points.csv'), '.x', folder)
+
+
+def test_chunks_quarantine_malformed_rows(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    _write_csv(path, ['0,0,0', 'x,1,2', '', '1,1,1', '2,2', '3,3,nan', '4,4,4'])
+    quarantine = QuarantineFile(path)
+    chunks = list(iter_point_chunks(path, 2, quarantine=quarantine))
+    quarantine.close()
+    assert [list(points) for points, _, _ in chunks] == [[0, 0, 0, 1, 1, 1], [4, 4, 4]]
+    assert [line for _, _, line in chunks] == [4, 7]
+    assert quarantine.count == 3
+    with open(quarantine.quarantine_path) as file:
+        assert file.read().splitlines() == ['line,row', '2,"x,1,2"', '5,"2,2"', '6,"3,3,nan"']
+
+
+def test_chunks_resume_from_offset(tmp_path):
+    rows = [f'{i},{i},{i}' for i in range(10)]
+    for compression in (None, 'gzip'):
+        path = str(tmp_path / f'points-{compression}.csv')
+        _write_csv(path, rows, compression)
+        chunks = list(iter_point_chunks(path, 3))
+        _, offset, line = chunks[1]
+        resumed = list(iter_point_chunks(path, 3, offset, line))
+        assert [list(points) for points, _, _ in resumed] == [list(points) for points, _, _ in chunks[2:]]
+        assert resumed[-1][2] == 10
+
+
+def test_chunks_of_lod_file(tmp_path):
+    path = str(tmp_path / 'points.stplod')
+    write_lod(path, array('d', range(30)), levels=1)
+    chunks = list(iter_point_chunks(path, 4))
+    assert [(len(points), offset) for points, offset, _ in chunks] == [(12, 4), (12, 8), (6, 10)]
+    assert [len(points) for points, _, _ in iter_point_chunks(path, 4, offset=8, line=8)] == [6]
+
+
+def test_quarantine_resumes_at_checkpoint_size(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    quarantine = QuarantineFile(path)
+    quarantine.add(2, 'a')
+    size = quarantine.size
+    quarantine.add(3, 'b')
+    quarantine.close()
+
+    # The job is resumed from a checkpoint written before row 3 was quarantined.
+    quarantine = QuarantineFile(path, size)
+    quarantine.add(3, 'b')
+    quarantine.close()
+    with open(quarantine.quarantine_path) as file:
+        assert file.read().splitlines() == ['line,row', '2,a', '3,b']
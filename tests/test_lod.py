@@ -0,0 +1,84 @@
+import os
+import random
+import struct
+import sys
+from array import array
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib'))
+
+from pointutils import is_lod_file, read_lod, read_lod_header, write_lod  # noqa: E402
+
+
+def _points(count=2000):
+    generator = random.Random(1)
+    return array('d', (generator.uniform(-10, 10) for _ in range(3 * count)))
+
+
+def _sorted_points(points):
+    return sorted(tuple(points[i:i + 3]) for i in range(0, len(points), 3))
+
+
+def test_header(tmp_path):
+    path = str(tmp_path / 'points.stplod')
+    points = _points()
+    written = write_lod(path, points, levels=3, tiles_per_axis=2)
+    header = read_lod_header(path)
+    assert is_lod_file(path)
+    assert header['count'] == 2000
+    assert len(header['levels']) == 3
+    assert sum(level['count'] for level in header['levels']) == 2000
+    assert header['levels'] == written['levels']
+    with open(path, 'rb') as file:
+        file.seek(8)
+        (length,) = struct.unpack('<Q', file.read(8))
+    assert header['data_offset'] == 16 + length
+
+
+def test_tile_offsets(tmp_path):
+    path = str(tmp_path / 'points.stplod')
+    points = _points()
+    write_lod(path, points, levels=3, tiles_per_axis=2)
+    header = read_lod_header(path)
+    offset = 0
+    with open(path, 'rb') as file:
+        for level in header['levels']:
+            for tile in level['tiles']:
+                assert tile['offset'] == offset
+                offset += 24 * tile['count']
+                file.seek(header['data_offset'] + tile['offset'])
+                block = array('d')
+                block.fromfile(file, 3 * tile['count'])
+                low, high = tile['bbox'][:3], tile['bbox'][3:]
+                for i in range(0, len(block), 3):
+                    assert all(low[axis] <= block[i + axis] <= high[axis] for axis in range(3))
+        assert file.seek(0, os.SEEK_END) == header['data_offset'] + offset
+
+
+def test_levels_are_progressive(tmp_path):
+    path = str(tmp_path / 'points.stplod')
+    points = _points()
+    write_lod(path, points, levels=3)
+    counts = [len(read_lod(path, level)) // 3 for level in range(3)]
+    assert counts[0] < counts[1] < counts[2] == 2000
+    assert _sorted_points(read_lod(path)) == _sorted_points(points)
+
+
+def test_region(tmp_path):
+    path = str(tmp_path / 'points.stplod')
+    points = _points()
+    write_lod(path, points)
+    region = [-5, -5, -5, 0, 0, 0]
+    expected = [point for point in _sorted_points(points)
+                if all(region[axis] <= point[axis] <= region[axis + 3] for axis in range(3))]
+    assert _sorted_points(read_lod(path, bbox=region)) == expected
+
+
+def test_not_a_lod_file(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    with open(path, 'w') as file:
+        file.write('1,2,3\n')
+    assert not is_lod_file(path)
+    with pytest.raises(ValueError):
+        read_lod_header(path)
@@ -0,0 +1,57 @@
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib'))
+
+from pointutils import iter_point_files, list_point_files, open_points_writer, write_lod  # noqa: E402
+from pointutils import _bootstrap, parallel  # noqa: E402
+
+PACKAGE_FOLDER = os.path.dirname(os.path.abspath(parallel.__file__))
+
+
+def _write_files(folder, count=5):
+    paths = []
+    for n in range(count):
+        path = os.path.join(folder, f'scan{n}.csv' + ('.gz' if n % 2 else ''))
+        with open_points_writer(path, 'gzip' if n % 2 else None) as file:
+            csv.writer(file).writerows([n, i, 0] for i in range(100 * (count - n)))
+        paths.append(path)
+    return paths
+
+
+def test_list_point_files(tmp_path):
+    paths = _write_files(str(tmp_path), 3)
+    write_lod(str(tmp_path / 'a.stplod'), [0.0, 0.0, 0.0])
+    (tmp_path / 'notes.txt').write_text('not points')
+    (tmp_path / 'sub.csv').mkdir()
+    assert list_point_files(str(tmp_path)) == [str(tmp_path / 'a.stplod')] + paths
+
+
+def test_iter_point_files_keeps_the_order(tmp_path):
+    paths = _write_files(str(tmp_path))
+    results = list(iter_point_files(paths, max_workers=2, max_pending=2))
+    assert [path for path, _ in results] == paths
+    for n, (_, points) in enumerate(results):
+        assert len(points) == 3 * 100 * (len(paths) - n)
+        assert set(points[0::3]) == {n}
+
+
+def test_iter_point_files_in_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel, '_python_executable', lambda: None)
+    paths = _write_files(str(tmp_path))
+    assert [path for path, _ in iter_point_files(paths, max_workers=2)] == paths
+
+
+def test_load_package_under_unique_name():
+    path = list(sys.path)
+    package = _bootstrap.load_package(PACKAGE_FOLDER)
+    assert package.__name__ == _bootstrap.package_name(PACKAGE_FOLDER)
+    assert package.__name__ != 'pointutils'
+    assert _bootstrap.load_package(PACKAGE_FOLDER) is package
+    assert package.parallel.parse_point_file.__module__ == package.__name__ + '.parallel'
+    assert sys.path == path
+
+
+def test_package_name_depends_on_the_folder(tmp_path):
+    assert _bootstrap.package_name(str(tmp_path / 'a')) != _bootstrap.package_name(str(tmp_path / 'b'))
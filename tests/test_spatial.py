@@ -0,0 +1,25 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib'))
+
+from pointutils import ScanMerger, remove_duplicates, remove_outliers  # noqa: E402
+
+
+def test_remove_outliers_with_repeated_isolated_point():
+    # Two exact duplicates far from the cloud only find each other at distance 0,
+    # the search for their remaining neighbours must still grow.
+    random.seed(1)
+    points = [random.random() for _ in range(3 * 200)]
+    points += [100.0, 100.0, 100.0] * 2
+    kept = remove_outliers(points, 8, 2.0)
+    assert len(kept) == 3 * 200
+    assert 100.0 not in kept
+
+
+def test_scan_merger_with_zero_tolerance_drops_exact_overlap():
+    merger = ScanMerger(0)
+    assert list(merger.add([0, 0, 0, 1, 1, 1, 1, 1, 1])) == [0, 0, 0, 1, 1, 1, 1, 1, 1]
+    assert list(merger.add([1, 1, 1, 2, 2, 2, 1, 1, 1e-9])) == [2, 2, 2, 1, 1, 1e-9]
+    assert list(remove_duplicates([0, 0, 0, 0, 0, 0, 0, 0, 1e-9], 0)) == [0, 0, 0, 0, 0, 1e-9]
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+from array import array
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib'))
+
+from pointutils import (PointStreamReceiver, PointStreamSender, handle_stream_message,  # noqa: E402
+                        pop_received_stream, send_stream)
+
+
+class _Palette:
+    # Records the messages sent to the palette.
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, action, data):
+        self.messages.append((action, json.loads(data)))
+
+    def take(self):
+        messages, self.messages = self.messages, []
+        return messages
+
+
+def _chunk_seqs(messages):
+    return [data['seq'] for action, data in messages if action == 'pointStreamChunk']
+
+
+def test_sender_window():
+    palette = _Palette()
+    sender = PointStreamSender(palette.send, array('d', range(30)), 'points', chunk_values=6, window=2)
+    sender.start()
+    messages = palette.take()
+    assert messages[0][0] == 'pointStreamBegin'
+    assert messages[0][1]['chunks'] == 5
+    assert _chunk_seqs(messages) == [0, 1]
+
+    sender.acknowledge(0)
+    assert _chunk_seqs(palette.take()) == [2]
+    sender.acknowledge(2)
+    assert _chunk_seqs(palette.take()) == [3]
+    sender.acknowledge(1)
+    sender.acknowledge(3)
+    assert _chunk_seqs(palette.take()) == [4]
+    assert not sender.done
+
+    sender.acknowledge(4)
+    assert palette.take() == [('pointStreamEnd', {'stream': sender.stream_id})]
+    assert sender.done
+
+
+def test_sender_chunks_decode_to_values():
+    palette = _Palette()
+    values = array('f', (i / 4 for i in range(20)))
+    sender = PointStreamSender(palette.send, values, chunk_values=9, window=8)
+    sender.start()
+    begin, *chunks = palette.take()
+    receiver = PointStreamReceiver(sender.stream_id, '', begin[1]['dtype'], begin[1]['count'], begin[1]['chunks'])
+    for _, data in chunks:
+        receiver.add_chunk(data['seq'], data['data'])
+    receiver.finish()
+    assert receiver.values == values
+
+
+def test_receiver_reorders_chunks():
+    palette = _Palette()
+    values = array('i', range(12))
+    PointStreamSender(palette.send, values, chunk_values=3, window=4).start()
+    begin, *chunks = palette.take()
+    receiver = PointStreamReceiver(1, '', 'int32', 12, 4)
+    for _, data in reversed(chunks):
+        receiver.add_chunk(data['seq'], data['data'])
+    receiver.finish()
+    assert receiver.values == values
+
+
+def test_receiver_detects_missing_chunk():
+    palette = _Palette()
+    PointStreamSender(palette.send, array('d', range(12)), chunk_values=3, window=4).start()
+    begin, *chunks = palette.take()
+    receiver = PointStreamReceiver(1, '', 'float64', 12, 4)
+    for _, data in chunks[:2] + chunks[3:]:
+        receiver.add_chunk(data['seq'], data['data'])
+    with pytest.raises(ValueError):
+        receiver.finish()
+
+
+def test_palette_stream_is_acknowledged():
+    # The palette side of a stream, as sent by the HTML page.
+    palette = _Palette()
+    values = array('d', range(15))
+    PointStreamSender(palette.send, values, chunk_values=6, window=4).start()
+    begin, *chunks = palette.take()
+    stream_id = 'palette-1'
+    begin[1]['stream'] = stream_id
+    handle_stream_message('pointStreamBegin', json.dumps(begin[1]))
+    for _, data in chunks:
+        data['stream'] = stream_id
+        ack = json.loads(handle_stream_message('pointStreamChunk', json.dumps(data)))
+        assert ack == {'stream': stream_id, 'seq': data['seq']}
+    assert pop_received_stream(stream_id) is None
+    handle_stream_message('pointStreamEnd', json.dumps({'stream': stream_id}))
+    assert pop_received_stream(stream_id).values == values
+    assert pop_received_stream(stream_id) is None
+
+
+def test_send_stream_progresses_with_acknowledgements():
+    palette = _Palette()
+    sender = send_stream(palette.send, array('d', range(3 * 70000)))
+    sent = _chunk_seqs(palette.take())
+    while sent:
+        for seq in sent:
+            handle_stream_message('pointStreamAck', json.dumps({'stream': sender.stream_id, 'seq': seq}))
+        messages = palette.take()
+        sent = _chunk_seqs(messages)
+    assert messages == [('pointStreamEnd', {'stream': sender.stream_id})]
+    assert sender.done